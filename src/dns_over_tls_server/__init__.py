@@ -1,14 +1,21 @@
 """DNS-over-TLS Server Package."""
 
+from typing import TYPE_CHECKING, Any
+
 __version__ = "0.1.0"
 
-from .server import DNSToTLSServer
-from .resolvers import (
-    resolve_with_doh,
-    resolve_with_curl,
-    resolve_with_kdig,
-    resolve_with_ssock,
-)
+if TYPE_CHECKING:
+    from .server import DNSToTLSServer
+    from .resolvers import (
+        Resolution,
+        resolve_many,
+        resolve_with_doh,
+        resolve_with_curl,
+        resolve_with_kdig,
+        resolve_with_pool,
+        resolve_with_ssock,
+    )
+    from .tracing import Tracer
 
 __all__ = [
     "DNSToTLSServer",
@@ -16,7 +23,36 @@ __all__ = [
     "resolve_with_curl", 
     "resolve_with_kdig",
     "resolve_with_ssock",
+    "resolve_with_pool",
+    "resolve_many",
+    "Resolution",
+    "Tracer",
 ]
 
+# Public names are imported on first access so that short-lived tools which
+# only need one submodule do not pay for loading the rest.
+_LAZY_EXPORTS = {
+    "DNSToTLSServer": "server",
+    "resolve_with_doh": "resolvers",
+    "resolve_with_curl": "resolvers",
+    "resolve_with_kdig": "resolvers",
+    "resolve_with_ssock": "resolvers",
+    "resolve_with_pool": "resolvers",
+    "resolve_many": "resolvers",
+    "Resolution": "resolvers",
+    "Tracer": "tracing",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_EXPORTS:
+        import importlib
+
+        module = importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def hello() -> str:
     return "Hello from dns-over-tls-server!"
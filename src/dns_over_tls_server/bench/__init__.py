@@ -0,0 +1,23 @@
+"""Benchmark tooling for the DNS-over-TLS server.
+
+Run ``python -m dns_over_tls_server.bench --help`` for the end-to-end load
+benchmark.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+
+def write_report(report: Dict[str, Any], path: Optional[str] = None) -> None:
+    """Write a benchmark report as indented JSON.
+
+    Args:
+        report: JSON-serializable results
+        path: File to write to (stdout if None)
+    """
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
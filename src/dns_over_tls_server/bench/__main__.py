@@ -0,0 +1,274 @@
+"""End-to-end load benchmark against a local stand-in upstream.
+
+Starts a self-signed DNS-over-TLS responder in place of 1.1.1.1:853, runs the
+server in a child process against it once per stub, drives it with the load
+generator and writes one JSON document with QPS, latency percentiles, CPU time
+of the measured run (where /proc is available) and peak RSS per stub. Only
+stubs whose upstream is configurable (``ssock`` and ``pool``) can be pointed at
+the stand-in; ``doh``, ``curl`` and ``kdig`` always talk to the public service.
+"""
+
+import argparse
+import os
+import platform
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import write_report
+from .loadgen import run_load, summarize
+from .upstream import StandInUpstream, make_self_signed_cert
+
+BENCH_STUBS = ["pool", "ssock"]
+
+
+def _free_port() -> int:
+    """Return a port that is currently free on localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def _wait_listening(address: Tuple[str, int], process: subprocess.Popen, timeout: float) -> None:
+    """Wait until the server under test accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            socket.create_connection(address, 0.5).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _peak_rss_kb(pid: int) -> Optional[int]:
+    """Peak resident set size of a running process, where /proc is available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    """User plus system CPU time of a running process, where /proc is available."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # Fields after the parenthesized command name start at field 3
+            fields = stat.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    utime, stime = int(fields[11]), int(fields[12])
+    return (utime + stime) / os.sysconf("SC_CLK_TCK")
+
+
+def _git_commit() -> Optional[str]:
+    """Commit of the working tree the benchmark runs from, if any."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def bench_stub(
+    stub: str,
+    upstream: StandInUpstream,
+    cafile: str,
+    names: List[str],
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """Benchmark the server with one stub resolver.
+    
+    Args:
+        stub: Stub resolver name
+        upstream: Running stand-in upstream
+        cafile: CA bundle that verifies the stand-in
+        names: Names to query
+        args: Parsed benchmark arguments
+        
+    Returns:
+        Benchmark results for the stub
+    """
+    address = ("127.0.0.1", _free_port())
+    command = [
+        sys.executable, "-m", "dns_over_tls_server.cli",
+        "--host", address[0],
+        "--port", str(address[1]),
+        "--stub", stub,
+        "--connections", str(args.concurrency),
+        "--upstream", upstream.host,
+        "--upstream-port", str(upstream.port),
+        "--upstream-hostname", "localhost",
+        "--cafile", cafile,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_listening(address, process, timeout=10.0)
+        if args.warmup:
+            run_load(address, names, queries=args.warmup, concurrency=args.concurrency)
+        # Only the measured run counts, not startup, imports, warmup or shutdown
+        cpu_before = _cpu_seconds(process.pid)
+        result = run_load(
+            address,
+            names,
+            queries=args.queries,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+        )
+        cpu_after = _cpu_seconds(process.pid)
+        peak_rss_kb = _peak_rss_kb(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu_seconds = (
+        cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    )
+    completed = len(result.latencies)
+    return {
+        "stub": stub,
+        "queries": args.queries,
+        "completed": completed,
+        "errors": result.errors,
+        "elapsed_s": result.elapsed,
+        "qps": completed / result.elapsed if result.elapsed else 0.0,
+        "latency": summarize(result.latencies),
+        "cpu_s": cpu_seconds,
+        "cpu_us_per_query": (
+            cpu_seconds / completed * 1e6 if cpu_seconds is not None and completed else None
+        ),
+        # ru_maxrss is the largest child so far (KiB on Linux), used without /proc
+        "peak_rss_kb": peak_rss_kb if peak_rss_kb is not None else usage_after.ru_maxrss,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m dns_over_tls_server.bench",
+        description="End-to-end load benchmark against a local stand-in upstream",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--stubs",
+        action="store",
+        type=str,
+        default=",".join(BENCH_STUBS),
+        help="comma-separated stub resolvers to benchmark",
+    )
+    parser.add_argument(
+        "-q",
+        "--queries",
+        action="store",
+        type=int,
+        default=2000,
+        help="queries to send per stub",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store",
+        type=int,
+        default=100,
+        help="queries to send before measuring",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        action="store",
+        type=int,
+        default=16,
+        help="concurrent client connections",
+    )
+    parser.add_argument(
+        "--names",
+        action="store",
+        type=int,
+        default=500,
+        help="distinct names to cycle through",
+    )
+    parser.add_argument(
+        "--latency",
+        action="store",
+        type=float,
+        default=0.005,
+        help="seconds the stand-in upstream waits before answering",
+    )
+    parser.add_argument(
+        "--loss",
+        action="store",
+        type=float,
+        default=0.0,
+        help="probability the stand-in upstream drops a query",
+    )
+    parser.add_argument(
+        "--timeout",
+        action="store",
+        type=float,
+        default=5.0,
+        help="per-query timeout in seconds",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        type=str,
+        default=None,
+        help="write JSON results to this file instead of stdout",
+    )
+    args = parser.parse_args(argv)
+
+    stubs = [stub for stub in args.stubs.split(",") if stub]
+    unsupported = sorted(set(stubs) - set(BENCH_STUBS))
+    if unsupported:
+        parser.error(f"stubs cannot target the stand-in upstream: {', '.join(unsupported)}")
+    names = [f"host{i}.bench.example" for i in range(args.names)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = make_self_signed_cert(directory)
+        with StandInUpstream(certfile, keyfile, latency=args.latency, loss=args.loss) as upstream:
+            results = [bench_stub(stub, upstream, certfile, names, args) for stub in stubs]
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "queries": args.queries,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "names": args.names,
+            "latency_s": args.latency,
+            "loss": args.loss,
+        },
+        "results": results,
+    }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
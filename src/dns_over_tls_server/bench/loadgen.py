@@ -0,0 +1,169 @@
+"""Concurrent load generator for the DNS-over-TLS server."""
+
+import itertools
+import math
+import socket
+import ssl
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..pool import recv_exactly
+
+
+class LoadResult(NamedTuple):
+    """Latencies and errors observed during a load run."""
+
+    latencies: List[float]
+    errors: int
+    elapsed: float
+
+
+class ServerClient:
+    """Client speaking the server's protocol: a name per line, DNS response back."""
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        timeout: float = 5.0,
+        tls_context: Optional[ssl.SSLContext] = None,
+    ):
+        """Initialize the client.
+        
+        Args:
+            address: Server address
+            timeout: Socket timeout in seconds
+            tls_context: Client TLS context if the server listens with TLS
+        """
+        self.address = address
+        self.timeout = timeout
+        self.tls_context = tls_context
+        self.sock: Optional[socket.socket] = None
+
+    def connect(self) -> None:
+        """Open the connection."""
+        sock = socket.create_connection(self.address, self.timeout)
+        if self.tls_context:
+            sock = self.tls_context.wrap_socket(sock, server_hostname=self.address[0])
+        self.sock = sock
+
+    def query(self, name: str) -> bytes:
+        """Send a name and read one length-prefixed response.
+        
+        Args:
+            name: Domain name to resolve
+            
+        Returns:
+            DNS response in wire format
+
+        Raises:
+            OSError: If the server closes the connection or times out
+        """
+        if self.sock is None:
+            self.connect()
+        assert self.sock is not None
+        self.sock.sendall(name.encode("utf-8") + b"\n")
+        (length,) = struct.unpack("!H", recv_exactly(self.sock, 2))
+        return recv_exactly(self.sock, length)
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+def run_load(
+    address: Tuple[str, int],
+    names: Iterable[str],
+    queries: int = 1000,
+    concurrency: int = 16,
+    timeout: float = 5.0,
+    tls_context: Optional[ssl.SSLContext] = None,
+) -> LoadResult:
+    """Drive a server with concurrent clients, each reusing its connection.
+    
+    Args:
+        address: Server address
+        names: Names to query, cycled until ``queries`` have been sent
+        queries: Total number of queries to send
+        concurrency: Number of concurrent client connections
+        timeout: Per-query timeout in seconds
+        tls_context: Client TLS context if the server listens with TLS
+        
+    Returns:
+        Latency of every successful query and the number of failed ones
+    """
+    name_cycle = itertools.cycle(list(names))
+    remaining = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = [0]
+
+    def worker() -> None:
+        client = ServerClient(address, timeout, tls_context)
+        try:
+            while True:
+                with lock:
+                    if next(remaining) >= queries:
+                        return
+                    name = next(name_cycle)
+                started = time.perf_counter()
+                try:
+                    client.query(name)
+                except OSError:
+                    # The server closes the connection on errors; reconnect
+                    client.close()
+                    with lock:
+                        errors[0] += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return LoadResult(latencies, errors[0], time.perf_counter() - started)
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence.
+    
+    Args:
+        ordered: Sorted values
+        fraction: Percentile as a fraction, e.g. 0.99
+        
+    Returns:
+        Percentile value, or 0.0 for an empty sequence
+    """
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: Iterable[float]) -> Dict[str, float]:
+    """Summarize latencies in milliseconds.
+    
+    Args:
+        latencies: Latencies in seconds
+        
+    Returns:
+        Mean, p50, p95, p99 and max latency in milliseconds
+    """
+    ordered = sorted(latencies)
+    mean = sum(ordered) / len(ordered) if ordered else 0.0
+    return {
+        "mean_ms": mean * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
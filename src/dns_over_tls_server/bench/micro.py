@@ -0,0 +1,215 @@
+"""Microbenchmarks for hot-path functions and package import time.
+
+Each benchmark is timed with ``timeit``: the loop count is calibrated so one
+repeat takes at least ``--min-time`` seconds, garbage collection is disabled
+while timing, and the per-call minimum, median and spread over ``--repeat``
+repeats are reported. Compare medians between commits; the minimum is the
+least noisy estimate of the intrinsic cost.
+"""
+
+import argparse
+import logging
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, cast
+
+import dns.message
+import validators
+
+from ..capture import OUTCOME_UNCACHED, CaptureWriter
+from ..connections import add_keepalive
+from ..server import DNSToTLSServer
+from ..ssock import SSLSocket
+from ..tracing import Tracer
+from . import write_report
+
+QUERY_NAME = "www.example.com"
+
+
+class _MemoryConnection:
+    """In-memory stand-in for a client socket, replaying queued queries."""
+
+    def __init__(self, queries: List[bytes]):
+        self._queries = list(reversed(queries))
+
+    def recv(self, size: int) -> bytes:
+        return self._queries.pop() if self._queries else b""
+
+    def sendall(self, data: bytes) -> None:
+        pass
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _handle_connection_benchmark(
+    queries_per_connection: int = 100, tracer: Optional[Tracer] = None
+) -> Callable[[], None]:
+    """Serve a connection's worth of queries through the server with a canned upstream."""
+    query = dns.message.make_query(QUERY_NAME, "A", use_edns=0)
+    wire = dns.message.make_response(query).to_wire()
+    response = len(wire).to_bytes(2, "big") + wire
+    server = DNSToTLSServer(
+        max_queries_per_connection=queries_per_connection + 1, tracer=tracer
+    )
+    server._get_resolver = lambda: (lambda name: response)  # type: ignore[assignment]
+    data = [QUERY_NAME.encode() + b"\n"] * queries_per_connection
+
+    def run() -> None:
+        connection = cast(socket.socket, _MemoryConnection(data))
+        server._handle_connection(connection, ("127.0.0.1", 12345))
+
+    return run
+
+
+def _capture_benchmark() -> Callable[[], None]:
+    writer = CaptureWriter("/dev/null")
+
+    def run() -> None:
+        writer.record(time.time(), "127.0.0.1", QUERY_NAME, 1, 0.001, OUTCOME_UNCACHED)
+
+    return run
+
+
+def _keepalive_benchmark() -> Callable[[], bytes]:
+    query = dns.message.make_query(QUERY_NAME, "A", use_edns=0)
+    wire = dns.message.make_response(query).to_wire()
+    return lambda: add_keepalive(wire, 30.0)
+
+
+def benchmarks() -> Dict[str, Callable[[], Any]]:
+    """Hot-path benchmarks by name, each a zero-argument callable.
+
+    Returns:
+        Mapping of benchmark name to callable
+    """
+    ssl_socket = SSLSocket()
+    return {
+        "validators.domain": lambda: validators.domain(QUERY_NAME),
+        "SSLSocket._padencode": lambda: ssl_socket._padencode(QUERY_NAME),
+        "add_keepalive": _keepalive_benchmark(),
+        "CaptureWriter.record": _capture_benchmark(),
+        "_handle_connection x100": _handle_connection_benchmark(100),
+        "_handle_connection x100 traced": _handle_connection_benchmark(100, Tracer()),
+    }
+
+
+def time_callable(func: Callable[[], Any], repeat: int = 7, min_time: float = 0.2) -> Dict[str, float]:
+    """Time a callable with calibrated loops and repeats.
+
+    Args:
+        func: Zero-argument callable to time
+        repeat: Number of timed repeats
+        min_time: Minimum seconds per repeat used to calibrate the loop count
+
+    Returns:
+        Loop count and per-call min, median, mean and stdev in microseconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    per_call = [total / number * 1e6 for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "loops": number,
+        "min_us": min(per_call),
+        "median_us": statistics.median(per_call),
+        "mean_us": statistics.mean(per_call),
+        "stdev_us": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+    }
+
+
+def time_import(module: str = "dns_over_tls_server.cli", repeat: int = 7) -> Dict[str, float]:
+    """Time importing a module in a fresh interpreter, net of interpreter startup.
+
+    Args:
+        module: Module to import
+        repeat: Number of fresh interpreters to start
+
+    Returns:
+        Per-run min, median and stdev in milliseconds
+    """
+
+    def run(code: str) -> List[float]:
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            durations.append((time.perf_counter() - started) * 1000)
+        return durations
+
+    baseline = statistics.median(run("pass"))
+    durations = [duration - baseline for duration in run(f"import {module}")]
+    return {
+        "min_ms": min(durations),
+        "median_ms": statistics.median(durations),
+        "stdev_ms": statistics.stdev(durations) if len(durations) > 1 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Microbenchmark entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m dns_over_tls_server.bench.micro",
+        description="Microbenchmarks for hot-path functions and import time",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        action="store",
+        type=str,
+        default="",
+        help="only run benchmarks whose name contains this string",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        action="store",
+        type=int,
+        default=7,
+        help="timed repeats per benchmark",
+    )
+    parser.add_argument(
+        "--min-time",
+        action="store",
+        type=float,
+        default=0.2,
+        help="minimum seconds per repeat",
+    )
+    parser.add_argument(
+        "--no-import",
+        action="store_true",
+        help="skip the import-time benchmark",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        type=str,
+        default=None,
+        help="write JSON results to this file instead of stdout",
+    )
+    args = parser.parse_args(argv)
+
+    # Per-query logging would dominate the server benchmarks
+    logging.disable(logging.WARNING)
+    results: Dict[str, Any] = {}
+    for name, func in benchmarks().items():
+        if args.filter in name:
+            results[name] = time_callable(func, repeat=args.repeat, min_time=args.min_time)
+    import_name = "import dns_over_tls_server.cli"
+    if not args.no_import and args.filter in import_name:
+        results[import_name] = time_import(repeat=args.repeat)
+
+    write_report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
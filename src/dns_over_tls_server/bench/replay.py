@@ -0,0 +1,197 @@
+"""Replay a query capture against a running server.
+
+Queries are sent at their recorded offsets divided by ``--speed`` (0 sends as
+fast as possible), each recorded client over its own reused connection, and
+the observed latency distribution is reported next to the recorded one.
+"""
+
+import argparse
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..capture import OUTCOME_HIT, OUTCOME_MISS, OUTCOME_NAMES, CaptureRecord, read_capture
+from . import write_report
+from .loadgen import ServerClient, summarize
+
+
+def hit_ratio(records: Sequence[CaptureRecord]) -> Optional[float]:
+    """Share of cache hits among queries with a known cache outcome.
+    
+    Args:
+        records: Captured queries
+        
+    Returns:
+        Hit ratio, or None if no query went through a cache
+    """
+    hits = sum(1 for record in records if record.outcome == OUTCOME_HIT)
+    misses = sum(1 for record in records if record.outcome == OUTCOME_MISS)
+    if not hits + misses:
+        return None
+    return hits / (hits + misses)
+
+
+def replay(
+    records: Sequence[CaptureRecord],
+    address: Tuple[str, int],
+    speed: float = 1.0,
+    concurrency: int = 64,
+    timeout: float = 5.0,
+    tls_context: Optional[ssl.SSLContext] = None,
+) -> Dict[str, Any]:
+    """Send captured queries to a server and measure their latency.
+    
+    Args:
+        records: Captured queries in recorded order
+        address: Server address
+        speed: Replay speed relative to the recording (0 for as fast as possible)
+        concurrency: Maximum queries in flight
+        timeout: Per-query timeout in seconds
+        tls_context: Client TLS context if the server listens with TLS
+        
+    Returns:
+        Replay report
+    """
+    clients: Dict[str, ServerClient] = {}
+    client_locks: Dict[str, threading.Lock] = {}
+    lock = threading.Lock()
+    latencies: List[float] = []
+    lags: List[float] = []
+    errors = [0]
+
+    def send(record: CaptureRecord, due: float) -> None:
+        with lock:
+            if record.client not in clients:
+                clients[record.client] = ServerClient(address, timeout, tls_context)
+                client_locks[record.client] = threading.Lock()
+            client = clients[record.client]
+            client_lock = client_locks[record.client]
+        # One query at a time per recorded client, as on its original connection
+        with client_lock:
+            started = time.perf_counter()
+            try:
+                client.query(record.qname)
+            except OSError:
+                client.close()
+                with lock:
+                    errors[0] += 1
+                return
+            elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            lags.append(max(0.0, started - due))
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        first = records[0].timestamp if records else 0.0
+        for record in records:
+            due = began
+            if speed > 0:
+                due += (record.timestamp - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(send, record, due)
+    elapsed = time.perf_counter() - began
+    for client in clients.values():
+        client.close()
+
+    outcomes: Dict[str, int] = {}
+    for record in records:
+        name = OUTCOME_NAMES.get(record.outcome, str(record.outcome))
+        outcomes[name] = outcomes.get(name, 0) + 1
+    return {
+        "queries": len(records),
+        "completed": len(latencies),
+        "errors": errors[0],
+        "clients": len(clients),
+        "elapsed_s": elapsed,
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "send_lag": summarize(lags),
+        "recorded": {
+            "duration_s": records[-1].timestamp - records[0].timestamp if records else 0.0,
+            "latency": summarize(record.latency for record in records),
+            "outcomes": outcomes,
+            "hit_ratio": hit_ratio(records),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Replay entry point."""
+    parser = argparse.ArgumentParser(
+        prog="python -m dns_over_tls_server.bench.replay",
+        description="Replay a query capture against a running server",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("capture", help="capture file written with --capture")
+    parser.add_argument(
+        "--server",
+        action="store",
+        type=str,
+        default="127.0.0.1:1053",
+        help="server address as host:port",
+    )
+    parser.add_argument(
+        "--speed",
+        action="store",
+        type=float,
+        default=1.0,
+        help="replay speed relative to the recording; 0 sends as fast as possible",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        action="store",
+        type=int,
+        default=64,
+        help="maximum queries in flight",
+    )
+    parser.add_argument(
+        "--timeout",
+        action="store",
+        type=float,
+        default=5.0,
+        help="per-query timeout in seconds",
+    )
+    parser.add_argument(
+        "--tls",
+        action="store_true",
+        help="connect to the server with TLS",
+    )
+    parser.add_argument(
+        "--cafile",
+        action="store",
+        type=str,
+        default=None,
+        help="CA bundle to verify the server with when using --tls",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        type=str,
+        default=None,
+        help="write JSON results to this file instead of stdout",
+    )
+    args = parser.parse_args(argv)
+
+    host, _, port = args.server.rpartition(":")
+    tls_context = ssl.create_default_context(cafile=args.cafile) if args.tls else None
+    records = list(read_capture(args.capture))
+    report = replay(
+        records,
+        (host, int(port)),
+        speed=args.speed,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        tls_context=tls_context,
+    )
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
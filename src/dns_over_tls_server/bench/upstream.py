@@ -0,0 +1,262 @@
+"""Local stand-in for a DNS-over-TLS upstream such as 1.1.1.1:853."""
+
+import ipaddress
+import os
+import random
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import time
+import zlib
+from typing import Iterable, Optional, Tuple
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+import dns.zone
+
+from ..pool import recv_exactly
+
+
+def make_self_signed_cert(directory: str) -> Tuple[str, str]:
+    """Generate a self-signed ECDSA certificate for localhost with openssl.
+    
+    Args:
+        directory: Directory to write cert.pem and key.pem to
+        
+    Returns:
+        Tuple of (certfile, keyfile) paths
+        
+    Raises:
+        subprocess.CalledProcessError: If openssl fails
+    """
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-nodes", "-days", "1",
+            "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+            "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout", keyfile, "-out", certfile,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    return certfile, keyfile
+
+
+class StandInUpstream:
+    """Threaded DNS-over-TLS responder with configurable latency and loss.
+
+    Every A query is answered with a stable address derived from the name, and
+    every AAAA query with its IPv6 counterpart; names whose first label starts
+    with ``nx`` get NXDOMAIN. Names inside one of the configured ``zones`` are
+    answered from that zone instead, with RRSIGs and NSEC denials when the
+    query sets the DO bit, so locally signed zones can stand in for DNSSEC-signed ones. A lost
+    query is simulated by closing the connection without answering, which is
+    how a DoT client observes loss.
+    """
+
+    def __init__(
+        self,
+        certfile: str,
+        keyfile: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        ttl: int = 300,
+        zones: Optional[Iterable[dns.zone.Zone]] = None,
+    ):
+        """Initialize the stand-in upstream.
+        
+        Args:
+            certfile: PEM certificate to present
+            keyfile: PEM private key for certfile
+            host: Address to listen on
+            port: Port to listen on (0 picks a free port)
+            latency: Seconds to wait before answering each query
+            loss: Probability of dropping a query and its connection
+            ttl: TTL of synthesized answers
+            zones: Zones to answer authoritatively from
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.loss = loss
+        self.ttl = ttl
+        self.zones = list(zones or [])
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.connections = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._listener: Optional[socket.socket] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Address the responder is listening on."""
+        return (self.host, self.port)
+
+    def start(self) -> "StandInUpstream":
+        """Start listening and serving in background threads.
+        
+        Returns:
+            The started responder
+        """
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.host, self.port))
+        self._listener.listen(128)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        """Stop accepting connections."""
+        if self._listener:
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+            self._listener = None
+
+    def __enter__(self) -> "StandInUpstream":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _accept(self) -> None:
+        """Accept connections until closed."""
+        listener = self._listener
+        while listener is not None:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: socket.socket) -> None:
+        """Answer queries on one connection until the client closes it."""
+        try:
+            connection = self.context.wrap_socket(connection, server_side=True)
+            while True:
+                (length,) = struct.unpack("!H", recv_exactly(connection, 2))
+                data = recv_exactly(connection, length)
+                with self._lock:
+                    self.queries += 1
+                if self.loss and random.random() < self.loss:
+                    return
+                if self.latency:
+                    time.sleep(self.latency)
+                wire = self.answer(dns.message.from_wire(data)).to_wire()
+                connection.sendall(struct.pack("!H", len(wire)) + wire)
+        except (ssl.SSLError, OSError, dns.exception.DNSException):
+            pass
+        finally:
+            connection.close()
+
+    def answer(self, query: dns.message.Message) -> dns.message.Message:
+        """Build the response to a query.
+        
+        Args:
+            query: DNS query message
+            
+        Returns:
+            DNS response message
+        """
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        zone = self._zone_for(question.name, question.rdtype)
+        if zone is not None:
+            self._answer_from_zone(zone, query, response)
+            return response
+        if question.name.labels and question.name.labels[0].startswith(b"nx"):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+            return response
+
+        seed = zlib.crc32(question.name.to_digestable())
+        if question.rdtype == dns.rdatatype.A:
+            address = str(ipaddress.IPv4Address(0xC6120000 | (seed & 0xFFFF)))
+        elif question.rdtype == dns.rdatatype.AAAA:
+            address = str(ipaddress.IPv6Address((0x20010DB8 << 96) | seed))
+        else:
+            return response
+        response.answer.append(
+            dns.rrset.from_text(question.name, self.ttl, "IN", question.rdtype, address)
+        )
+        return response
+
+    def _zone_for(self, name: dns.name.Name, rdtype: int) -> Optional[dns.zone.Zone]:
+        """Find the closest enclosing zone; DS records live in the parent zone."""
+        best: Optional[dns.zone.Zone] = None
+        best_origin = dns.name.empty
+        for zone in self.zones:
+            origin = zone.origin
+            if origin is None or not name.is_subdomain(origin):
+                continue
+            if rdtype == dns.rdatatype.DS and name == origin:
+                continue
+            if best is None or origin.is_subdomain(best_origin):
+                best, best_origin = zone, origin
+        return best
+
+    def _answer_from_zone(
+        self,
+        zone: dns.zone.Zone,
+        query: dns.message.Message,
+        response: dns.message.Message,
+    ) -> None:
+        """Fill in a response from zone data, with NSEC denials if signed."""
+        question = query.question[0]
+        want_dnssec = bool(query.ednsflags & dns.flags.DO)
+
+        def add(section: list, name: dns.name.Name, rdtype: int) -> bool:
+            node = zone.get_node(name)
+            if node is None:
+                return False
+            rdataset = node.get_rdataset(dns.rdataclass.IN, dns.rdatatype.RdataType.make(rdtype))
+            if rdataset is None:
+                return False
+            section.append(dns.rrset.from_rdata_list(name, rdataset.ttl, list(rdataset)))
+            if want_dnssec:
+                rrsigs = node.get_rdataset(
+                    dns.rdataclass.IN,
+                    dns.rdatatype.RRSIG,
+                    dns.rdatatype.RdataType.make(rdtype),
+                )
+                if rrsigs is not None:
+                    section.append(dns.rrset.from_rdata_list(name, rrsigs.ttl, list(rrsigs)))
+            return True
+
+        if add(response.answer, question.name, question.rdtype):
+            return
+        origin = zone.origin
+        assert origin is not None
+        add(response.authority, origin, dns.rdatatype.SOA)
+        if zone.get_node(question.name) is not None:
+            if want_dnssec:
+                add(response.authority, question.name, dns.rdatatype.NSEC)
+            return
+        response.set_rcode(dns.rcode.NXDOMAIN)
+        if want_dnssec:
+            # The NSEC record of the closest preceding name covers the query name
+            preceding = [
+                name for name, _ in zone.iterate_rdatasets(dns.rdatatype.NSEC)
+                if name < question.name
+            ]
+            if preceding:
+                add(response.authority, max(preceding), dns.rdatatype.NSEC)
@@ -0,0 +1,149 @@
+"""Compact binary capture of served queries for offline replay.
+
+A capture file starts with an 8-byte header (``DOTCAP``, format version,
+reserved byte) followed by one variable-length record per query::
+
+    !d   timestamp (seconds since the epoch, when the query was received)
+    !f   latency (seconds from receipt until the response was sent)
+    !H   qtype
+    !B   outcome (see OUTCOME_*)
+    !B   client address length (4 or 16), then the packed address
+    !B   qname length, then the ASCII qname
+"""
+
+import ipaddress
+import struct
+import threading
+from typing import BinaryIO, Iterator, NamedTuple, Union
+
+MAGIC = b"DOTCAP"
+VERSION = 1
+_HEADER = MAGIC + bytes([VERSION, 0])
+_RECORD = struct.Struct("!dfHBB")
+
+# Cache outcome of a query. The proxy has no response cache yet, so served
+# queries are recorded as OUTCOME_UNCACHED until one sets HIT or MISS.
+OUTCOME_UNCACHED = 0
+OUTCOME_HIT = 1
+OUTCOME_MISS = 2
+OUTCOME_ERROR = 3
+
+OUTCOME_NAMES = {
+    OUTCOME_UNCACHED: "uncached",
+    OUTCOME_HIT: "hit",
+    OUTCOME_MISS: "miss",
+    OUTCOME_ERROR: "error",
+}
+
+
+class CaptureRecord(NamedTuple):
+    """One captured query."""
+
+    timestamp: float
+    client: str
+    qname: str
+    qtype: int
+    latency: float
+    outcome: int
+
+
+class CaptureWriter:
+    """Thread-safe writer appending capture records to a file.
+
+    Records arriving after close() are dropped, so connection threads that
+    outlive a shutdown drain can still finish their queries.
+    """
+
+    def __init__(self, path: str):
+        """Open a capture file for writing, replacing any existing file.
+
+        Args:
+            path: Capture file path
+        """
+        self.path = path
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(_HEADER)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        timestamp: float,
+        client: str,
+        qname: str,
+        qtype: int,
+        latency: float,
+        outcome: int,
+    ) -> None:
+        """Append one query to the capture.
+
+        Args:
+            timestamp: Seconds since the epoch when the query was received
+            client: Client IP address
+            qname: Queried domain name
+            qtype: Query type
+            latency: Seconds from receipt until the response was sent
+            outcome: One of the OUTCOME_* constants
+        """
+        address = ipaddress.ip_address(client).packed
+        name = qname.encode("ascii", errors="replace")[:255]
+        data = (
+            _RECORD.pack(timestamp, latency, qtype, outcome, len(address))
+            + address
+            + bytes([len(name)])
+            + name
+        )
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(data)
+
+    def close(self) -> None:
+        """Flush and close the capture file."""
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(source: Union[str, BinaryIO]) -> Iterator[CaptureRecord]:
+    """Read records from a capture file.
+
+    Args:
+        source: Capture file path or binary file object
+
+    Yields:
+        Captured queries in the order they were recorded
+
+    Raises:
+        ValueError: If the file is not a capture or is truncated
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from read_capture(f)
+        return
+
+    header = source.read(len(_HEADER))
+    if len(header) < len(_HEADER) or header[: len(MAGIC)] != MAGIC:
+        raise ValueError("not a DNS-over-TLS server capture file")
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError(f"unsupported capture version {header[len(MAGIC)]}")
+
+    while True:
+        fixed = source.read(_RECORD.size)
+        if not fixed:
+            return
+        if len(fixed) < _RECORD.size:
+            raise ValueError("truncated capture record")
+        timestamp, latency, qtype, outcome, address_length = _RECORD.unpack(fixed)
+        address = source.read(address_length)
+        name_length = source.read(1)
+        if len(address) < address_length or not name_length:
+            raise ValueError("truncated capture record")
+        name = source.read(name_length[0])
+        if len(name) < name_length[0]:
+            raise ValueError("truncated capture record")
+        yield CaptureRecord(
+            timestamp,
+            str(ipaddress.ip_address(address)),
+            name.decode("ascii"),
+            qtype,
+            latency,
+            outcome,
+        )
@@ -1,14 +1,36 @@
 """Command-line interface for DNS-over-TLS server."""
 
 import argparse
+import json
 import logging
+import signal
 import sys
+from typing import Any, Dict, Iterator, List, Optional, TextIO
 
-from .server import DNSToTLSServer
+import dns.flags
 
+from .pool import UpstreamPool
+from .resolvers import Resolution, configure_dnssec, configure_upstream, resolve_many
+from .tls import DOT_PORT
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Main CLI entry point.
+
+    ``dns-over-tls-server resolve ...`` runs the batch resolver; any other
+    arguments start the proxy server.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["resolve"]:
+        resolve_main(argv[1:])
+        return
+
+    # Imported here so the batch resolver does not load the server
+    from .profiling import Profiler
+    from .server import DNSToTLSServer
+    from .tracing import JSONLinesExporter, Tracer
 
-def main() -> None:
-    """Main CLI entry point."""
     parser = argparse.ArgumentParser(
         description="DNS to DNS-over-TLS proxy server",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -18,8 +40,9 @@ def main() -> None:
         "--port",
         action="store",
         type=int,
-        default=1053,
-        help="listening port for incoming DNS queries",
+        default=None,
+        help=f"listening port for incoming DNS queries "
+        f"[1053, or {DOT_PORT} with --tls-cert]",
     )
     parser.add_argument(
         "-c",
@@ -35,7 +58,7 @@ def main() -> None:
         action="store",
         type=str,
         default="doh",
-        choices=["doh", "curl", "kdig", "ssock"],
+        choices=["doh", "curl", "kdig", "ssock", "pool"],
         help="choose which stub resolver to use",
     )
     parser.add_argument(
@@ -45,6 +68,129 @@ def main() -> None:
         default="0.0.0.0",
         help="host to bind to",
     )
+    parser.add_argument(
+        "--tls-cert",
+        action="store",
+        type=str,
+        default=None,
+        help="PEM certificate; serves DNS-over-TLS to clients when set",
+    )
+    parser.add_argument(
+        "--tls-key",
+        action="store",
+        type=str,
+        default=None,
+        help="PEM private key for --tls-cert",
+    )
+    parser.add_argument(
+        "--tls-ticket-rotation",
+        action="store",
+        type=float,
+        default=3600.0,
+        help="seconds between TLS session-ticket key rotations",
+    )
+    parser.add_argument(
+        "--upstream",
+        action="store",
+        type=str,
+        default=None,
+        help="upstream DNS-over-TLS resolver for the ssock and pool stubs [1.1.1.1]",
+    )
+    parser.add_argument(
+        "--upstream-port",
+        action="store",
+        type=int,
+        default=853,
+        help="upstream DNS-over-TLS resolver port",
+    )
+    parser.add_argument(
+        "--upstream-hostname",
+        action="store",
+        type=str,
+        default=None,
+        help="name to verify in the upstream certificate [--upstream]",
+    )
+    parser.add_argument(
+        "--cafile",
+        action="store",
+        type=str,
+        default=None,
+        help="CA bundle to verify the upstream with",
+    )
+    parser.add_argument(
+        "--dnssec",
+        action="store_true",
+        help="validate DNSSEC signatures of answers from the pool stub",
+    )
+    parser.add_argument(
+        "--trust-anchor",
+        action="store",
+        type=str,
+        default=None,
+        help="file of DS records to use as DNSSEC trust anchors [root KSKs]",
+    )
+    parser.add_argument(
+        "--max-clients",
+        action="store",
+        type=int,
+        default=1024,
+        help="maximum open client connections",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        action="store",
+        type=float,
+        default=30.0,
+        help="seconds an idle client connection may stay open when lightly loaded",
+    )
+    parser.add_argument(
+        "--max-queries",
+        action="store",
+        type=int,
+        default=1000,
+        help="queries served on one client connection before it is closed",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        action="store",
+        type=float,
+        default=10.0,
+        help="seconds to let in-flight queries finish on shutdown",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store",
+        type=str,
+        default=None,
+        help="record every served query to this file for later replay",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="record per-stage query timings; SIGUSR1 toggles the sampling "
+        "profiler and dumps samples and timings",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        action="store",
+        type=str,
+        default=".",
+        help="directory for profiler sample dumps",
+    )
+    parser.add_argument(
+        "--trace-slow-ms",
+        action="store",
+        type=float,
+        default=None,
+        help="log queries slower than this many milliseconds with their stage breakdown",
+    )
+    parser.add_argument(
+        "--trace-file",
+        action="store",
+        type=str,
+        default=None,
+        help="append the stage timings of every query to this file as JSON lines",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -52,7 +198,7 @@ def main() -> None:
         help="enable verbose logging",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Set up logging
     log_level = logging.DEBUG if args.verbose else logging.INFO
@@ -61,20 +207,221 @@ def main() -> None:
         level=log_level,
     )
 
+    if args.upstream:
+        configure_upstream(
+            args.upstream,
+            args.upstream_port,
+            server_hostname=args.upstream_hostname,
+            cafile=args.cafile,
+        )
+
+    if args.dnssec:
+        if args.stub != "pool":
+            logging.warning("DNSSEC validation only applies to the pool stub")
+        try:
+            configure_dnssec(trust_anchors=_trust_anchors(args.trust_anchor))
+        except (ImportError, OSError, ValueError) as e:
+            logging.error("Cannot enable DNSSEC validation: %s", e)
+            sys.exit(1)
+
+    port = args.port
+    if port is None:
+        port = DOT_PORT if args.tls_cert else 1053
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler(output_dir=args.profile_dir)
+        profiler.install_signal_handler(signal.SIGUSR1)
+        logging.info("Profiling enabled; send SIGUSR1 to toggle sampling")
+
+    tracer = None
+    exporter = None
+    if args.trace_slow_ms is not None or args.trace_file:
+        slow_threshold = None
+        if args.trace_slow_ms is not None:
+            slow_threshold = args.trace_slow_ms / 1000
+        tracer = Tracer(slow_threshold=slow_threshold)
+        if args.trace_file:
+            exporter = JSONLinesExporter(args.trace_file)
+            tracer.add_hook(exporter)
+
     try:
         server = DNSToTLSServer(
-            port=args.port,
+            port=port,
             max_connections=args.connections,
             stub_resolver=args.stub,
             host=args.host,
+            tls_certfile=args.tls_cert,
+            tls_keyfile=args.tls_key,
+            tls_ticket_rotation=args.tls_ticket_rotation,
+            max_clients=args.max_clients,
+            idle_timeout=args.idle_timeout,
+            max_queries_per_connection=args.max_queries,
+            drain_timeout=args.drain_timeout,
+            capture_path=args.capture,
+            profiler=profiler,
+            tracer=tracer,
         )
+        # Drain in-flight queries when the orchestrator asks us to stop
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
         server.start()
+        if profiler:
+            if profiler.sampling:
+                profiler.stop_sampling()
+            else:
+                profiler.log_stages()
     except KeyboardInterrupt:
         logging.info("Server interrupted by user")
         sys.exit(0)
     except Exception as e:
         logging.error("Server failed to start: %s", e)
         sys.exit(1)
+    finally:
+        if exporter:
+            exporter.close()
+
+
+def _read_names(stream: TextIO) -> Iterator[str]:
+    """Yield one domain name per non-empty, non-comment line."""
+    for line in stream:
+        name = line.strip()
+        if name and not name.startswith("#"):
+            yield name
+
+
+def _trust_anchors(path: Optional[str]) -> Optional[List[Any]]:
+    """Load DNSSEC trust anchors from a file, or None for the root KSKs."""
+    if path is None:
+        return None
+    from .dnssec import load_trust_anchors
+
+    return load_trust_anchors(path)
+
+
+def _resolution_to_json(resolution: Resolution, dnssec: bool = False) -> Dict[str, Any]:
+    """Convert a batch resolution into a JSON-serializable record."""
+    record: Dict[str, Any] = {"name": resolution.name, "qtype": resolution.qtype}
+    if resolution.response is None:
+        record["error"] = str(resolution.error)
+        return record
+    record["rcode"] = resolution.response.rcode()
+    if dnssec:
+        record["ad"] = bool(resolution.response.flags & dns.flags.AD)
+    record["answer"] = [
+        line for rrset in resolution.response.answer for line in rrset.to_text().splitlines()
+    ]
+    return record
+
+
+def resolve_main(argv: List[str]) -> None:
+    """Batch resolver entry point: resolve names and write JSON lines."""
+    parser = argparse.ArgumentParser(
+        prog="dns-over-tls-server resolve",
+        description="Resolve many names concurrently over DNS-over-TLS",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "file",
+        nargs="?",
+        type=argparse.FileType("r"),
+        default=sys.stdin,
+        help="file with one name per line (stdin if omitted or '-')",
+    )
+    parser.add_argument(
+        "-t",
+        "--qtype",
+        action="store",
+        type=str,
+        default="A",
+        help="query type for every name",
+    )
+    parser.add_argument(
+        "-n",
+        "--concurrency",
+        action="store",
+        type=int,
+        default=32,
+        help="maximum queries in flight",
+    )
+    parser.add_argument(
+        "--upstream",
+        action="store",
+        type=str,
+        default="1.1.1.1",
+        help="upstream DNS-over-TLS resolver address",
+    )
+    parser.add_argument(
+        "--upstream-port",
+        action="store",
+        type=int,
+        default=853,
+        help="upstream DNS-over-TLS resolver port",
+    )
+    parser.add_argument(
+        "--upstream-hostname",
+        action="store",
+        type=str,
+        default="cloudflare-dns.com",
+        help="name to verify in the upstream certificate",
+    )
+    parser.add_argument(
+        "--cafile",
+        action="store",
+        type=str,
+        default=None,
+        help="CA bundle to verify the upstream with",
+    )
+    parser.add_argument(
+        "--dnssec",
+        action="store_true",
+        help="validate DNSSEC signatures; bogus answers become SERVFAIL",
+    )
+    parser.add_argument(
+        "--trust-anchor",
+        action="store",
+        type=str,
+        default=None,
+        help="file of DS records to use as DNSSEC trust anchors [root KSKs]",
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    pool = UpstreamPool(
+        hostname=args.upstream,
+        port=args.upstream_port,
+        server_hostname=args.upstream_hostname,
+        cafile=args.cafile,
+        max_idle=args.concurrency,
+    )
+    validator = None
+    if args.dnssec:
+        from .dnssec import DNSSECValidator
+
+        try:
+            validator = DNSSECValidator(
+                lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True),
+                _trust_anchors(args.trust_anchor),
+            )
+        except (ImportError, OSError, ValueError) as e:
+            parser.error(f"cannot enable DNSSEC validation: {e}")
+    failures = 0
+    try:
+        for resolution in resolve_many(
+            _read_names(args.file),
+            qtype=args.qtype,
+            concurrency=args.concurrency,
+            pool=pool,
+            validator=validator,
+        ):
+            failures += resolution.error is not None
+            record = _resolution_to_json(resolution, dnssec=validator is not None)
+            sys.stdout.write(json.dumps(record) + "\n")
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        pool.close()
+    sys.exit(1 if failures else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,261 @@
+"""Client connection lifecycle management."""
+
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Optional
+
+# EDNS option code for edns-tcp-keepalive (RFC 7828)
+EDNS_TCP_KEEPALIVE = 11
+
+# Resource record type of the EDNS pseudo-record (RFC 6891)
+_OPT = 41
+
+
+class ConnectionTracker:
+    """Track open client connections and decide how long they may stay idle.
+
+    The idle timeout shrinks linearly once more than half of ``max_clients``
+    slots are in use, down to ``min_idle_timeout`` when the server is full, so
+    idle keepalive clients give way to new ones under load (RFC 7766 6.2.3).
+    Connections that have already been idle longer than the shrunken timeout
+    are closed when a new client arrives, rather than refusing the new one.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 1024,
+        idle_timeout: float = 30.0,
+        min_idle_timeout: float = 1.0,
+        max_queries: int = 1000,
+    ):
+        """Initialize the connection tracker.
+
+        Args:
+            max_clients: Maximum simultaneously open client connections
+            idle_timeout: Seconds an idle connection may stay open when lightly loaded
+            min_idle_timeout: Seconds an idle connection may stay open when full
+            max_queries: Queries served on one connection before it is closed
+        """
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.min_idle_timeout = min_idle_timeout
+        self.max_queries = max_queries
+        self.draining = threading.Event()
+        # monotonic() time each connection became idle, None while busy
+        self._idle_since: Dict[socket.socket, Optional[float]] = {}
+        self._condition = threading.Condition()
+
+    @property
+    def active(self) -> int:
+        """Number of open client connections."""
+        with self._condition:
+            return len(self._idle_since)
+
+    def register(self, connection: socket.socket) -> bool:
+        """Start tracking a newly accepted connection.
+
+        Args:
+            connection: Accepted client socket
+
+        Returns:
+            False if the server is full of busy or recently active
+            connections, or draining, and the connection should be refused
+        """
+        with self._condition:
+            if self.draining.is_set():
+                return False
+            now = time.monotonic()
+            occupied = len(self._idle_since) + 1
+            if occupied > self.max_clients / 2:
+                self._close_idle(now, self._idle_timeout_for(occupied))
+            if len(self._idle_since) >= self.max_clients:
+                return False
+            self._idle_since[connection] = now
+            return True
+
+    def _close_idle(self, now: float, timeout: float) -> None:
+        """Close connections idle for longer than timeout; the lock must be held.
+
+        Their serving threads see the connection closed by the peer and exit.
+        """
+        expired = [
+            connection
+            for connection, idle_since in self._idle_since.items()
+            if idle_since is not None and now - idle_since > timeout
+        ]
+        for connection in expired:
+            del self._idle_since[connection]
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        if expired:
+            logging.info("Closed %s idle connections to make room", len(expired))
+
+    def unregister(self, connection: socket.socket) -> None:
+        """Stop tracking a closed connection.
+
+        Args:
+            connection: Client socket that was closed
+        """
+        with self._condition:
+            self._idle_since.pop(connection, None)
+            self._condition.notify_all()
+
+    def replace(self, old: socket.socket, new: socket.socket) -> None:
+        """Track a connection under a new socket object, e.g. after a TLS handshake.
+
+        Args:
+            old: Socket the connection was registered with
+            new: Socket now carrying the connection
+        """
+        with self._condition:
+            if old in self._idle_since:
+                self._idle_since[new] = self._idle_since.pop(old)
+
+    def set_busy(self, connection: socket.socket, busy: bool) -> None:
+        """Mark whether a connection has a query in flight.
+
+        Args:
+            connection: Tracked client socket
+            busy: True while a query is being resolved and answered
+        """
+        with self._condition:
+            if connection in self._idle_since:
+                self._idle_since[connection] = None if busy else time.monotonic()
+
+    def current_idle_timeout(self) -> float:
+        """Return the idle timeout for the current occupancy.
+
+        Returns:
+            Seconds an idle connection may wait for its next query (0 while
+            draining)
+        """
+        if self.draining.is_set():
+            return 0.0
+        return self._idle_timeout_for(self.active)
+
+    def _idle_timeout_for(self, connections: int) -> float:
+        """Return the idle timeout with the given number of open connections."""
+        occupancy = connections / self.max_clients
+        if occupancy <= 0.5:
+            return self.idle_timeout
+        scale = (1.0 - occupancy) / 0.5
+        return max(
+            self.min_idle_timeout,
+            self.min_idle_timeout + (self.idle_timeout - self.min_idle_timeout) * scale,
+        )
+
+    def drain(self, timeout: float) -> bool:
+        """Refuse new connections and wait for open ones to finish.
+
+        Idle connections are woken up so they close immediately; connections
+        with a query in flight close once its response has been sent.
+
+        Args:
+            timeout: Seconds to wait for connections to close
+
+        Returns:
+            True if every connection closed within the timeout
+        """
+        self.draining.set()
+        with self._condition:
+            for connection, idle_since in self._idle_since.items():
+                if idle_since is not None:
+                    try:
+                        connection.shutdown(socket.SHUT_RD)
+                    except OSError:
+                        pass
+            closed = self._condition.wait_for(lambda: not self._idle_since, timeout)
+            if not closed:
+                logging.warning(
+                    "Drain timed out with %s connections still open", len(self._idle_since)
+                )
+            return closed
+
+
+def _skip_name(wire: bytes, offset: int) -> int:
+    """Return the offset just past a (possibly compressed) domain name."""
+    while True:
+        length = wire[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += 1 + length
+        if length == 0:
+            return offset
+
+
+def _find_opt(wire: bytes) -> Optional[int]:
+    """Locate the RDLENGTH field of the OPT record in a DNS message.
+
+    Args:
+        wire: DNS message in wire format
+
+    Returns:
+        Offset of the OPT record's RDLENGTH, or None if the message has no
+        OPT record or is not a well-formed DNS message
+    """
+    try:
+        qdcount, ancount, nscount, arcount = struct.unpack_from("!HHHH", wire, 4)
+        offset = 12
+        for _ in range(qdcount):
+            offset = _skip_name(wire, offset) + 4
+        opt = None
+        for index in range(ancount + nscount + arcount):
+            offset = _skip_name(wire, offset)
+            rdtype, _, _, rdlength = struct.unpack_from("!HHIH", wire, offset)
+            if rdtype == _OPT and index >= ancount + nscount:
+                opt = offset + 8
+            offset += 10 + rdlength
+    except (IndexError, struct.error):
+        return None
+    return opt if offset == len(wire) else None
+
+
+def add_keepalive(response: bytes, timeout: float) -> bytes:
+    """Advertise edns-tcp-keepalive (RFC 7828) in a DNS response.
+
+    Responses that are not DNS messages, or that carry no OPT record, are
+    returned unchanged. A two-byte length prefix (RFC 7858) is preserved.
+    The option is spliced into the OPT record in place rather than by
+    re-rendering the message, as this runs for every response.
+
+    Args:
+        response: DNS response in wire format, optionally length-prefixed
+        timeout: Idle timeout to advertise in seconds
+
+    Returns:
+        Response with the keepalive option added
+    """
+    prefix = b""
+    wire = response
+    opt = _find_opt(wire)
+    if opt is None:
+        if len(response) < 2 or struct.unpack("!H", response[:2])[0] != len(response) - 2:
+            return response
+        prefix, wire = response[:2], response[2:]
+        opt = _find_opt(wire)
+        if opt is None:
+            return response
+
+    (rdlength,) = struct.unpack_from("!H", wire, opt)
+    rdata_start = opt + 2
+    rdata_end = rdata_start + rdlength
+    options = []
+    offset = rdata_start
+    while offset + 4 <= rdata_end:
+        code, length = struct.unpack_from("!HH", wire, offset)
+        if code != EDNS_TCP_KEEPALIVE:
+            options.append(wire[offset : offset + 4 + length])
+        offset += 4 + length
+    options.append(
+        struct.pack("!HHH", EDNS_TCP_KEEPALIVE, 2, min(int(timeout * 10), 0xFFFF))
+    )
+    rdata = b"".join(options)
+    wire = wire[:opt] + struct.pack("!H", len(rdata)) + rdata + wire[rdata_end:]
+    if prefix:
+        prefix = struct.pack("!H", len(wire))
+    return prefix + wire
@@ -0,0 +1,556 @@
+"""DNSSEC validation of upstream answers with a validated-chain cache.
+
+Requires the ``cryptography`` package (``pip install dnspython[dnssec]``).
+
+Answers are validated from the trust anchors down: each zone's DNSKEY RRset
+is accepted once it is signed by a key matching a DS record that was itself
+validated in the parent. A delegation without a DS record is only accepted
+as insecure when the parent zone itself proves the absence with a signed
+NSEC or NSEC3 record, and an unsigned RRset, or one
+signed by a zone that is not secure, is only passed on if its name lies
+below such a proven insecure delegation (or outside every trust anchor);
+inside a secure zone it is bogus.
+
+Zone status (secure with its validated keys, insecure, not a zone cut, or
+bogus) is cached per name, and each name's chain is built only once even
+when many queries need it at the same time. Successful signature checks are
+memoized per RRset and RRSIG until the signature expires, so a warm zone
+costs no upstream queries and no public-key operations.
+
+Limitations: NSEC/NSEC3 proofs in answers are not checked to cover the
+queried name, so negative answers (NXDOMAIN and NODATA) are at most
+insecure, though their signatures must still validate. An NSEC3 opt-out
+span is accepted as proof of an insecure delegation without a
+closest-encloser proof. A signature is attributed to its signer's zone
+without probing for zone cuts between the signer and the owner name.
+"""
+
+import base64
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import dns.dnssec
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import dns.zone
+
+try:
+    import cryptography  # noqa: F401
+
+    _HAVE_CRYPTOGRAPHY = True
+except ImportError:
+    _HAVE_CRYPTOGRAPHY = False
+
+SECURE = "secure"
+INSECURE = "insecure"
+BOGUS = "bogus"
+
+# Zone status of a name that is not a zone apex; it belongs to its parent's zone
+_NOT_A_ZONE = "not a zone"
+
+# IANA root zone KSK-2017 and KSK-2024
+ROOT_TRUST_ANCHOR = dns.rrset.from_text(
+    ".",
+    172800,
+    "IN",
+    "DS",
+    "20326 8 2 E06D44B80B8F1D39A95C0B0D7C65D08458E880409BBC683457104237C7F8EC8D",
+    "38696 8 2 683D2D0ACB8C9B712A1948B27F741219298D0A450D612C483AF444A4C0FB2B16",
+)
+
+QueryFunction = Callable[[str, str], dns.message.Message]
+
+
+class BogusError(Exception):
+    """Raised when a signature or the chain of trust does not validate."""
+
+
+class _ZoneStatus(NamedTuple):
+    """Cached chain-of-trust status of one name."""
+
+    kind: str
+    keys: Optional[dns.rrset.RRset]
+    expires: float
+
+
+def load_trust_anchors(path: str) -> List[dns.rrset.RRset]:
+    """Read DS trust anchors from a file in master-file format.
+
+    Args:
+        path: File with one absolute DS record per line, e.g.
+            ``example. 3600 IN DS 12345 13 2 ...``
+
+    Returns:
+        One DS RRset per owner name
+
+    Raises:
+        ValueError: If the file cannot be parsed or holds no DS records
+    """
+    try:
+        zone = dns.zone.from_file(
+            path, origin=dns.name.root, relativize=False, check_origin=False
+        )
+    except dns.exception.DNSException as e:
+        raise ValueError(f"cannot read trust anchors from {path}: {e}") from e
+    anchors = [
+        dns.rrset.from_rdata_list(name, rdataset.ttl, list(rdataset))
+        for name, rdataset in zone.iterate_rdatasets(dns.rdatatype.DS)
+    ]
+    if not anchors:
+        raise ValueError(f"no DS records in {path}")
+    return anchors
+
+
+class DNSSECValidator:
+    """Validate DNS responses against a chain of trust, caching validated zones."""
+
+    def __init__(
+        self,
+        query: QueryFunction,
+        trust_anchors: Optional[Iterable[dns.rrset.RRset]] = None,
+        max_zones: int = 4096,
+        max_signatures: int = 65536,
+        min_ttl: int = 60,
+        bogus_ttl: int = 30,
+        build_timeout: float = 30.0,
+    ):
+        """Initialize the validator.
+
+        Args:
+            query: Function sending a query with the DO bit set upstream,
+                called as query(name, rdtype)
+            trust_anchors: DS RRsets to trust (the root KSKs if None)
+            max_zones: Maximum names kept in the validated-chain cache
+            max_signatures: Maximum memoized signature checks
+            min_ttl: Minimum seconds to cache a validated zone
+            bogus_ttl: Seconds to remember a broken chain of trust
+            build_timeout: Seconds to wait for another thread building the
+                chain of trust of the same zone before giving up
+
+        Raises:
+            ImportError: If the cryptography package is not installed
+        """
+        if not _HAVE_CRYPTOGRAPHY:
+            raise ImportError(
+                "DNSSEC validation requires cryptography: pip install dnspython[dnssec]"
+            )
+        self.query = query
+        anchors = [ROOT_TRUST_ANCHOR] if trust_anchors is None else list(trust_anchors)
+        self.trust_anchors: Dict[dns.name.Name, dns.rrset.RRset] = {
+            anchor.name: anchor for anchor in anchors
+        }
+        self.max_zones = max_zones
+        self.max_signatures = max_signatures
+        self.min_ttl = min_ttl
+        self.bogus_ttl = bogus_ttl
+        self.build_timeout = build_timeout
+        self._zones: "OrderedDict[dns.name.Name, _ZoneStatus]" = OrderedDict()
+        self._building: Dict[dns.name.Name, threading.Event] = {}
+        self._local = threading.local()
+        self._signatures: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "zone_hits": 0,
+            "zone_misses": 0,
+            "signature_hits": 0,
+            "signature_misses": 0,
+            "upstream_queries": 0,
+        }
+
+    def validate(self, response: dns.message.Message) -> str:
+        """Validate every RRset in the answer and authority sections.
+
+        Args:
+            response: Upstream response to a query sent with the DO bit
+
+        Returns:
+            SECURE, INSECURE or BOGUS; negative answers are never SECURE
+            because their NSEC/NSEC3 proofs are not checked to cover the name
+        """
+        try:
+            statuses = [
+                self._validate_section(response.answer),
+                self._validate_section(response.authority),
+            ]
+        except BogusError as e:
+            logging.warning("DNSSEC validation failed for %s: %s", response.question, e)
+            return BOGUS
+        if not response.answer or response.rcode() == dns.rcode.NXDOMAIN:
+            return INSECURE
+        return SECURE if all(status == SECURE for status in statuses) else INSECURE
+
+    def apply(self, response: dns.message.Message) -> dns.message.Message:
+        """Validate a response and rewrite it accordingly.
+
+        Secure answers get the AD flag, insecure ones have it cleared, and
+        bogus ones are replaced by SERVFAIL as RFC 4035 section 5.5 requires.
+
+        Args:
+            response: Upstream response to a query sent with the DO bit
+
+        Returns:
+            The response to hand to the client
+        """
+        status = self.validate(response)
+        if status == BOGUS:
+            failure = dns.message.Message(id=response.id)
+            failure.flags = response.flags & ~dns.flags.AD
+            failure.set_rcode(dns.rcode.SERVFAIL)
+            failure.question = list(response.question)
+            return failure
+        if status == SECURE:
+            response.flags |= dns.flags.AD
+        else:
+            response.flags &= ~dns.flags.AD
+        return response
+
+    def _validate_section(self, section: List[dns.rrset.RRset]) -> str:
+        """Validate the RRsets of one message section.
+
+        Returns:
+            SECURE if every RRset is signed by a validated zone, else INSECURE
+
+        Raises:
+            BogusError: If any signature fails to validate, or an RRset in a
+                secure zone is unsigned or signed by another zone
+        """
+        signatures: Dict[Tuple[dns.name.Name, int], dns.rrset.RRset] = {}
+        for rrset in section:
+            if rrset.rdtype == dns.rdatatype.RRSIG:
+                signatures[(rrset.name, rrset.covers)] = rrset
+
+        status = SECURE
+        for rrset in section:
+            if rrset.rdtype == dns.rdatatype.RRSIG:
+                continue
+            description = f"{rrset.name} {dns.rdatatype.to_text(rrset.rdtype)}"
+            rrsigs = signatures.get((rrset.name, rrset.rdtype))
+            if rrsigs is None:
+                zone_keys = self._enclosing_keys(_zone_name(rrset, None))
+                if zone_keys is not None:
+                    raise BogusError(f"unsigned {description} in secure zone {zone_keys.name}")
+                status = INSECURE
+                continue
+            signer = rrsigs[0].signer
+            zone = _zone_name(rrset, signer)
+            if not zone.is_subdomain(signer):
+                raise BogusError(f"{description} signed by unrelated zone {signer}")
+            keys = self._enclosing_keys(signer)
+            if keys is None:
+                # An insecure signer must not vouch for data in a secure zone
+                zone_keys = self._enclosing_keys(zone)
+                if zone_keys is not None:
+                    raise BogusError(
+                        f"{description} signed by {signer}, not by its zone {zone_keys.name}"
+                    )
+                status = INSECURE
+                continue
+            if keys.name != signer:
+                raise BogusError(f"{description} signed by {signer}, which is not a zone apex")
+            self._verify(rrset, rrsigs, keys)
+        return status
+
+    def _verify(
+        self,
+        rrset: dns.rrset.RRset,
+        rrsigs: dns.rrset.RRset,
+        keys: dns.rrset.RRset,
+    ) -> None:
+        """Check that one of the signatures over rrset validates with keys.
+
+        Successful checks are memoized until the signature expires.
+
+        Raises:
+            BogusError: If no signature validates
+        """
+        now = time.time()
+        rdatas = frozenset(rrset)
+        for rrsig in rrsigs:
+            memo_key = (rrset.name, rrset.rdtype, rdatas, rrsig, frozenset(keys))
+            with self._lock:
+                expires = self._signatures.get(memo_key)
+                if expires is not None and expires > now:
+                    self._signatures.move_to_end(memo_key)
+                    self.stats["signature_hits"] += 1
+                    return
+                self.stats["signature_misses"] += 1
+            try:
+                dns.dnssec.validate_rrsig(rrset, rrsig, {keys.name: keys}, now=now)
+            except dns.dnssec.ValidationFailure:
+                continue
+            with self._lock:
+                self._signatures[memo_key] = float(rrsig.expiration)
+                while len(self._signatures) > self.max_signatures:
+                    self._signatures.popitem(last=False)
+            return
+        raise BogusError(f"no valid signature over {rrset.name} {dns.rdatatype.to_text(rrset.rdtype)}")
+
+    def _fetch(self, name: dns.name.Name, rdtype: str) -> dns.message.Message:
+        with self._lock:
+            self.stats["upstream_queries"] += 1
+        return self.query(name.to_text(), rdtype)
+
+    def _enclosing_keys(self, name: dns.name.Name) -> Optional[dns.rrset.RRset]:
+        """Return the validated keys of the zone holding name.
+
+        Walks down from the closest trust anchor one label at a time; every
+        step is a cache hit once the names on the way have been looked up.
+
+        Args:
+            name: Owner name
+
+        Returns:
+            DNSKEY RRset of the closest enclosing zone, or None if name is
+            outside every trust anchor or below an insecure delegation
+
+        Raises:
+            BogusError: If the chain of trust down to name is broken
+        """
+        anchor = max(
+            (anchor for anchor in self.trust_anchors if name.is_subdomain(anchor)),
+            key=lambda anchor: len(anchor.labels),
+            default=None,
+        )
+        if anchor is None:
+            return None
+        keys = self._zone_status(anchor).keys
+        for depth in range(len(anchor.labels) + 1, len(name.labels) + 1):
+            if keys is None:
+                break
+            _, child = name.split(depth)
+            status = self._zone_status(child)
+            if status.kind != _NOT_A_ZONE:
+                keys = status.keys
+        return keys
+
+    def _zone_status(self, name: dns.name.Name) -> _ZoneStatus:
+        """Return the cached chain-of-trust status of a name, building it once.
+
+        Concurrent callers needing the same name wait for the first one to
+        build its chain instead of repeating the upstream queries. Waits are
+        bounded by build_timeout, so threads whose chains depend on each
+        other fail instead of blocking forever.
+
+        Raises:
+            BogusError: If the chain of trust is broken (cached for bogus_ttl),
+                or another thread did not finish building it in time
+        """
+        building_here = self._building_here()
+        while True:
+            with self._lock:
+                cached = self._zones.get(name)
+                if cached is not None and cached.expires > time.monotonic():
+                    self._zones.move_to_end(name)
+                    self.stats["zone_hits"] += 1
+                    if cached.kind == BOGUS:
+                        raise BogusError(f"chain of trust for {name} is broken")
+                    return cached
+                done = self._building.get(name)
+                if done is None:
+                    done = self._building[name] = threading.Event()
+                    self.stats["zone_misses"] += 1
+                    break
+            if name in building_here:
+                raise BogusError(f"circular chain of trust at {name}")
+            if not done.wait(self.build_timeout):
+                raise BogusError(f"timed out waiting for the chain of trust of {name}")
+
+        building_here.add(name)
+        try:
+            kind, keys, ttl = self._build_chain(name)
+            status = _ZoneStatus(kind, keys, time.monotonic() + max(ttl, self.min_ttl))
+            self._store(name, status)
+            return status
+        except BogusError:
+            self._store(name, _ZoneStatus(BOGUS, None, time.monotonic() + self.bogus_ttl))
+            raise
+        finally:
+            building_here.discard(name)
+            with self._lock:
+                del self._building[name]
+            done.set()
+
+    def _store(self, name: dns.name.Name, status: _ZoneStatus) -> None:
+        with self._lock:
+            self._zones[name] = status
+            while len(self._zones) > self.max_zones:
+                self._zones.popitem(last=False)
+
+    def _building_here(self) -> Set[dns.name.Name]:
+        """Names whose chain the current thread is building."""
+        building: Optional[Set[dns.name.Name]] = getattr(self._local, "building", None)
+        if building is None:
+            building = self._local.building = set()
+        return building
+
+    def _build_chain(
+        self, name: dns.name.Name
+    ) -> Tuple[str, Optional[dns.rrset.RRset], int]:
+        """Establish the chain-of-trust status of a name from its parent.
+
+        Returns:
+            Status (SECURE, INSECURE or _NOT_A_ZONE), the validated DNSKEY
+            RRset if secure, and the cache TTL
+
+        Raises:
+            BogusError: If the chain of trust is broken
+        """
+        if name in self.trust_anchors:
+            ds = self.trust_anchors[name]
+            keys = self._validated_dnskeys(name, ds)
+            return SECURE, keys, keys.ttl
+        if name == dns.name.root:
+            raise BogusError("no trust anchor for the root zone")
+
+        # Nothing below an insecure delegation can be secure
+        parent_keys = self._enclosing_keys(name.parent())
+        if parent_keys is None:
+            return INSECURE, None, 0
+
+        response = self._fetch(name, "DS")
+        answer_ds = _find_rrset(response.answer, name, dns.rdatatype.DS)
+        if answer_ds is None:
+            if not response.authority or self._validate_section(response.authority) != SECURE:
+                raise BogusError(f"missing DS for {name} is not proven by a signed denial")
+            denial = _ds_denial(name, parent_keys.name, response.authority)
+            if denial is None:
+                raise BogusError(f"no NSEC/NSEC3 record proves {name} has no DS")
+            return denial, None, min(rrset.ttl for rrset in response.authority)
+        if self._validate_section(response.answer) != SECURE:
+            raise BogusError(f"DS for {name} is not validly signed")
+
+        keys = self._validated_dnskeys(name, answer_ds)
+        return SECURE, keys, min(answer_ds.ttl, keys.ttl)
+
+    def _validated_dnskeys(self, zone: dns.name.Name, ds: dns.rrset.RRset) -> dns.rrset.RRset:
+        """Fetch a zone's DNSKEY RRset and validate it against its DS records.
+
+        Raises:
+            BogusError: If no DS-matching key signs the DNSKEY RRset
+        """
+        response = self._fetch(zone, "DNSKEY")
+        dnskeys = _find_rrset(response.answer, zone, dns.rdatatype.DNSKEY)
+        rrsigs = _find_rrset(response.answer, zone, dns.rdatatype.RRSIG, dns.rdatatype.DNSKEY)
+        if dnskeys is None or rrsigs is None:
+            raise BogusError(f"{zone} has a DS record but no signed DNSKEY set")
+
+        # The DNSKEY set must be signed by a key that the DS records vouch for
+        trusted = dns.rrset.RRset(zone, dnskeys.rdclass, dns.rdatatype.DNSKEY)
+        trusted.update_ttl(dnskeys.ttl)
+        for key in dnskeys:
+            for ds_rdata in ds:
+                try:
+                    digest = dns.dnssec.make_ds(zone, key, ds_rdata.digest_type)
+                except (dns.dnssec.UnsupportedAlgorithm, ValueError):
+                    continue
+                if digest == ds_rdata:
+                    trusted.add(key)
+        if not trusted:
+            raise BogusError(f"no DNSKEY of {zone} matches its DS records")
+        self._verify(dnskeys, rrsigs, trusted)
+        return dnskeys
+
+
+def _zone_name(rrset: dns.rrset.RRset, signer: Optional[dns.name.Name]) -> dns.name.Name:
+    """Return a name in the zone that holds rrset.
+
+    DS and NSEC3 records, and the NSEC record a parent zone keeps at a
+    delegation, belong to the zone above their owner name.
+    """
+    if rrset.name == dns.name.root:
+        return rrset.name
+    if rrset.rdtype in (dns.rdatatype.DS, dns.rdatatype.NSEC3):
+        return rrset.name.parent()
+    if rrset.rdtype == dns.rdatatype.NSEC and signer is not None and signer != rrset.name:
+        return rrset.name.parent()
+    return rrset.name
+
+
+def _ds_denial(
+    name: dns.name.Name, parent: dns.name.Name, authority: List[dns.rrset.RRset]
+) -> Optional[str]:
+    """Interpret validated NSEC/NSEC3 records denying a DS record for name.
+
+    Only records of the parent zone count; a denial from any other zone,
+    e.g. a replayed opt-out span of a grandparent, proves nothing about name.
+
+    Args:
+        name: Owner name of the DS query
+        parent: Apex of the zone enclosing name's parent
+        authority: Authority section whose signatures were validated
+
+    Returns:
+        INSECURE if name is a delegation without DS, _NOT_A_ZONE if name is
+        not a delegation, or None if the records prove neither
+    """
+    signers = {
+        (rrset.name, rrset.covers): rrset[0].signer
+        for rrset in authority
+        if rrset.rdtype == dns.rdatatype.RRSIG
+    }
+    for rrset in authority:
+        if signers.get((rrset.name, rrset.rdtype)) != parent:
+            continue
+        if rrset.rdtype == dns.rdatatype.NSEC:
+            for nsec in rrset:
+                if rrset.name == name:
+                    return _denial_from_types(_bitmap_types(nsec.windows))
+                if rrset.name < name and (name < nsec.next or nsec.next <= rrset.name):
+                    # name does not exist, so it cannot be a zone cut
+                    return _NOT_A_ZONE
+        elif rrset.rdtype == dns.rdatatype.NSEC3 and rrset.name.parent() == parent:
+            owner_hash = rrset.name.labels[0].decode("ascii").upper()
+            for nsec3 in rrset:
+                name_hash = dns.dnssec.nsec3_hash(
+                    name, nsec3.salt, nsec3.iterations, nsec3.algorithm
+                )
+                if name_hash == owner_hash:
+                    return _denial_from_types(_bitmap_types(nsec3.windows))
+                next_hash = base64.b32hexencode(nsec3.next).decode("ascii").rstrip("=")
+                covered = owner_hash < name_hash < next_hash or (
+                    next_hash <= owner_hash and (name_hash > owner_hash or name_hash < next_hash)
+                )
+                if covered:
+                    # Opt-out spans may hide unsigned delegations
+                    return INSECURE if nsec3.flags & 1 else _NOT_A_ZONE
+    return None
+
+
+def _denial_from_types(types: Set[int]) -> Optional[str]:
+    """Interpret the type bitmap of an NSEC/NSEC3 record matching a DS query."""
+    if dns.rdatatype.DS in types or dns.rdatatype.SOA in types:
+        # Either the DS exists, or the record comes from the child zone
+        return None
+    return INSECURE if dns.rdatatype.NS in types else _NOT_A_ZONE
+
+
+def _bitmap_types(windows: Iterable[Tuple[int, bytes]]) -> Set[int]:
+    """Decode an NSEC/NSEC3 type bitmap."""
+    types = set()
+    for window, bitmap in windows:
+        for index, octet in enumerate(bitmap):
+            for bit in range(8):
+                if octet & (0x80 >> bit):
+                    types.add(window * 256 + index * 8 + bit)
+    return types
+
+
+def _find_rrset(
+    section: List[dns.rrset.RRset],
+    name: dns.name.Name,
+    rdtype: int,
+    covers: int = dns.rdatatype.NONE,
+) -> Optional[dns.rrset.RRset]:
+    """Find an RRset by owner, type and covered type in a message section."""
+    for rrset in section:
+        if rrset.name == name and rrset.rdtype == rdtype and rrset.covers == covers:
+            return rrset
+    return None
@@ -0,0 +1,202 @@
+"""Pooled DNS-over-TLS upstream connections."""
+
+import contextlib
+import logging
+import socket
+import ssl
+import struct
+import threading
+from typing import Iterator, List, Optional
+
+import dns.exception
+import dns.message
+
+from . import tracing
+
+
+def recv_exactly(sock: socket.socket, count: int) -> bytes:
+    """Read exactly count bytes from a socket.
+
+    Args:
+        sock: Connected socket
+        count: Number of bytes to read
+
+    Returns:
+        Bytes read
+
+    Raises:
+        ConnectionError: If the peer closes the connection first
+    """
+    data = b""
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("peer closed the connection")
+        data += chunk
+    return data
+
+
+class UpstreamConnection:
+    """A single persistent DNS-over-TLS connection speaking RFC 7858 framing."""
+
+    def __init__(self, sock: ssl.SSLSocket):
+        """Initialize the upstream connection.
+
+        Args:
+            sock: Connected TLS socket
+        """
+        self.sock = sock
+        self.queries = 0
+
+    def query(self, message: dns.message.Message) -> dns.message.Message:
+        """Send a query and wait for its response.
+
+        Args:
+            message: DNS query message
+
+        Returns:
+            DNS response message
+
+        Raises:
+            OSError: If the connection fails or is closed by the upstream
+            dns.exception.DNSException: If the response is malformed or
+                does not answer the query
+        """
+        wire = message.to_wire()
+        self.sock.sendall(struct.pack("!H", len(wire)) + wire)
+        (length,) = struct.unpack("!H", recv_exactly(self.sock, 2))
+        response = dns.message.from_wire(recv_exactly(self.sock, length))
+        if not message.is_response(response):
+            raise dns.exception.FormError("response does not match query")
+        self.queries += 1
+        tracing.mark("upstream")
+        return response
+
+    def close(self) -> None:
+        """Close the connection."""
+        self.sock.close()
+
+
+class UpstreamPool:
+    """Pool of reusable DNS-over-TLS connections to one upstream resolver.
+
+    Idle connections are kept for reuse, and new connections resume the most
+    recent TLS session, so steady traffic pays neither TCP nor full TLS
+    handshakes per query.
+    """
+
+    def __init__(
+        self,
+        hostname: str = "1.1.1.1",
+        port: int = 853,
+        server_hostname: str = "cloudflare-dns.com",
+        cafile: Optional[str] = None,
+        max_idle: int = 16,
+        timeout: float = 10.0,
+    ):
+        """Initialize the upstream pool.
+
+        Args:
+            hostname: Upstream resolver address
+            port: Upstream resolver port
+            server_hostname: Name to verify in the upstream certificate
+            cafile: CA bundle to verify the upstream with (system default if None)
+            max_idle: Maximum idle connections kept for reuse
+            timeout: Socket timeout in seconds for connect and queries
+        """
+        self.hostname = hostname
+        self.port = port
+        self.server_hostname = server_hostname
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.context = ssl.create_default_context(cafile=cafile)
+        self._idle: List[UpstreamConnection] = []
+        self._lock = threading.Lock()
+        self._session: Optional[ssl.SSLSession] = None
+
+    def _connect(self) -> UpstreamConnection:
+        """Open a new connection, resuming the last TLS session if possible.
+
+        Returns:
+            New upstream connection
+        """
+        sock = socket.create_connection((self.hostname, self.port), self.timeout)
+        tracing.mark("upstream_connect")
+        try:
+            wrsock = self.context.wrap_socket(
+                sock,
+                server_hostname=self.server_hostname,
+                session=self._session,
+            )
+        except (ssl.SSLError, OSError):
+            sock.close()
+            raise
+        self._session = wrsock.session
+        tracing.mark("upstream_handshake")
+        return UpstreamConnection(wrsock)
+
+    @contextlib.contextmanager
+    def acquire(self, fresh: bool = False) -> Iterator[UpstreamConnection]:
+        """Borrow a connection, returning it to the pool if it is still healthy.
+
+        Args:
+            fresh: Open a new connection instead of reusing an idle one
+
+        Yields:
+            Upstream connection for exclusive use within the block
+        """
+        connection = None
+        if not fresh:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._connect()
+
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def query(
+        self, name: str, qtype: str = "A", want_dnssec: bool = False
+    ) -> dns.message.Message:
+        """Resolve a name over a pooled connection.
+
+        A reused connection may have been closed by the upstream while idle,
+        so a failure on one is retried once on a fresh connection.
+
+        Args:
+            name: Domain name to resolve
+            qtype: Query type
+            want_dnssec: Set the DO bit to request DNSSEC records
+
+        Returns:
+            DNS response message
+        """
+        # EDNS lets the server add edns-tcp-keepalive to the response
+        message = dns.message.make_query(name, qtype, use_edns=0, want_dnssec=want_dnssec)
+        reused = False
+        try:
+            with self.acquire() as connection:
+                reused = connection.queries > 0
+                return connection.query(message)
+        except (OSError, EOFError) as e:
+            if not reused:
+                raise
+            logging.debug("Retrying %s on a fresh upstream connection: %s", name, e)
+        with self.acquire(fresh=True) as connection:
+            return connection.query(message)
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
@@ -0,0 +1,184 @@
+"""Runtime profiling: per-stage query timings and a toggleable sampling profiler."""
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .tracing import Trace
+
+
+class StageStats:
+    """Count, total and maximum duration of one query-handling stage."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        """Add one observation in seconds."""
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def as_dict(self) -> Dict[str, float]:
+        """Summary in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "max_us": self.max * 1e6,
+            "total_s": self.total,
+        }
+
+
+class Profiler:
+    """Per-stage timings plus a sampling profiler that can be toggled by signal.
+
+    The sampler walks the stacks of every thread at a fixed interval, so unlike
+    cProfile it covers all connection threads and costs nothing while off.
+    Samples are written in the folded-stack format read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, output_dir: str = ".", interval: float = 0.005):
+        """Initialize the profiler.
+
+        Args:
+            output_dir: Directory to write sample dumps to
+            interval: Seconds between stack samples while sampling
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.stages: Dict[str, StageStats] = {}
+        self._samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._sampling = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._dumps = 0
+
+    def record_stages(self, timestamps: List[Any]) -> None:
+        """Record the durations between consecutive stage boundaries.
+
+        Args:
+            timestamps: (stage name, perf_counter value) pairs in order; each
+                stage's duration is measured from the previous boundary
+        """
+        with self._lock:
+            for (_, previous), (stage, now) in zip(timestamps, timestamps[1:]):
+                if stage not in self.stages:
+                    self.stages[stage] = StageStats()
+                self.stages[stage].add(now - previous)
+
+    def record_trace(self, trace: "Trace") -> None:
+        """Trace hook recording the stages of a finished query.
+
+        Args:
+            trace: Finished query trace
+        """
+        self.record_stages(trace.marks)
+
+    def stage_report(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage summaries in microseconds."""
+        with self._lock:
+            return {stage: stats.as_dict() for stage, stats in self.stages.items()}
+
+    @property
+    def sampling(self) -> bool:
+        """Whether the sampling profiler is running."""
+        return self._sampling.is_set()
+
+    def start_sampling(self) -> None:
+        """Start sampling the stacks of all threads."""
+        if self._sampling.is_set():
+            return
+        self._sampling.set()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._sampler.start()
+        logging.info("Sampling profiler started")
+
+    def stop_sampling(self) -> Optional[str]:
+        """Stop sampling, dump the samples and log per-stage timings.
+
+        Returns:
+            Path of the folded-stack dump, or None if sampling was not running
+        """
+        if not self._sampling.is_set():
+            return None
+        self._sampling.clear()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+        path = self.dump()
+        logging.info("Sampling profiler stopped, samples written to %s", path)
+        self.log_stages()
+        return path
+
+    def toggle(self) -> None:
+        """Start sampling if stopped, otherwise stop and dump."""
+        if self._sampling.is_set():
+            self.stop_sampling()
+        else:
+            self.start_sampling()
+
+    def install_signal_handler(self, signum: int = signal.SIGUSR1) -> None:
+        """Toggle sampling whenever the process receives ``signum``.
+
+        Args:
+            signum: Signal to listen for
+        """
+        signal.signal(signum, lambda received, frame: self.toggle())
+
+    def _sample(self) -> None:
+        """Collect stack samples until sampling is stopped."""
+        own_id = threading.get_ident()
+        while self._sampling.is_set():
+            for thread_id, top in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                frame: Optional[FrameType] = top
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                with self._lock:
+                    self._samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump(self) -> str:
+        """Write collected samples in folded-stack format and reset them.
+
+        Returns:
+            Path of the written file
+        """
+        with self._lock:
+            samples, self._samples = self._samples, Counter()
+            self._dumps += 1
+            path = os.path.join(
+                self.output_dir, f"dns-over-tls-profile-{os.getpid()}-{self._dumps}.folded"
+            )
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def log_stages(self) -> None:
+        """Log per-stage query timings."""
+        for stage, stats in self.stage_report().items():
+            logging.info(
+                "Stage %-10s count=%d mean=%.1fus max=%.1fus",
+                stage,
+                stats["count"],
+                stats["mean_us"],
+                stats["max_us"],
+            )
@@ -1,9 +1,33 @@
 """DNS resolver implementations."""
 
+import struct
 import subprocess
-from typing import Union
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, NamedTuple, Optional, Union
 
-from . import ssock
+import dns.message
+
+from . import ssock, tracing
+from .pool import UpstreamPool
+
+if TYPE_CHECKING:
+    import dns.rrset
+
+    from .dnssec import DNSSECValidator
+
+_default_pool: Optional[UpstreamPool] = None
+_default_pool_lock = threading.Lock()
+_validator: Optional["DNSSECValidator"] = None
+
+
+class Resolution(NamedTuple):
+    """Outcome of resolving one name in a batch."""
+
+    name: str
+    qtype: str
+    response: Optional[dns.message.Message]
+    error: Optional[Exception]
 
 
 def resolve_with_doh(query: str) -> str:
@@ -58,6 +82,160 @@ def resolve_with_ssock(query: str) -> Union[str, bytes]:
     return ssock.connectsend(query)
 
 
+def get_default_pool() -> UpstreamPool:
+    """Return the shared upstream pool, creating it on first use.
+
+    Returns:
+        Upstream pool for Cloudflare's DNS-over-TLS service
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = UpstreamPool()
+        return _default_pool
+
+
+def configure_upstream(
+    hostname: str,
+    port: int = 853,
+    server_hostname: Optional[str] = None,
+    cafile: Optional[str] = None,
+) -> None:
+    """Point the ssock and pool resolvers at a different DNS-over-TLS upstream.
+
+    Args:
+        hostname: Upstream resolver address
+        port: Upstream resolver port
+        server_hostname: Name to verify in the upstream certificate
+            (defaults to hostname)
+        cafile: CA bundle to verify the upstream with
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = UpstreamPool(
+            hostname,
+            port,
+            server_hostname=server_hostname or hostname,
+            cafile=cafile,
+        )
+    ssock.configure(hostname, port, cafile)
+
+
+def configure_dnssec(
+    enabled: bool = True,
+    trust_anchors: Optional[Iterable["dns.rrset.RRset"]] = None,
+) -> None:
+    """Enable or disable DNSSEC validation in the pool resolver.
+
+    Args:
+        enabled: Whether to validate answers
+        trust_anchors: DS RRsets to trust (the root KSKs if None)
+
+    Raises:
+        ImportError: If the cryptography package is not installed
+    """
+    global _validator
+    if not enabled:
+        _validator = None
+        return
+
+    from .dnssec import DNSSECValidator
+
+    _validator = DNSSECValidator(
+        lambda name, rdtype: get_default_pool().query(name, rdtype, want_dnssec=True),
+        trust_anchors,
+    )
+
+
+def resolve_with_pool(query: str) -> bytes:
+    """Resolve DNS query over a pooled, persistent DNS-over-TLS connection.
+    
+    With DNSSEC validation enabled (see configure_dnssec), secure answers
+    carry the AD flag and bogus ones are replaced by SERVFAIL.
+    
+    Args:
+        query: Domain name to resolve
+        
+    Returns:
+        Length-prefixed DNS response in wire format (RFC 7858)
+    """
+    validator = _validator
+    if validator is None:
+        response = get_default_pool().query(query)
+    else:
+        response = validator.apply(get_default_pool().query(query, want_dnssec=True))
+        tracing.mark("dnssec")
+    wire = response.to_wire()
+    return struct.pack("!H", len(wire)) + wire
+
+
+def resolve_many(
+    names: Iterable[str],
+    qtype: str = "A",
+    concurrency: int = 32,
+    pool: Optional[UpstreamPool] = None,
+    validator: Optional["DNSSECValidator"] = None,
+) -> Iterator[Resolution]:
+    """Resolve many names concurrently over pooled upstream connections.
+
+    Names are consumed lazily and at most ``concurrency`` queries are in
+    flight at once, so arbitrarily large inputs run in constant memory.
+    Results are yielded as they complete, not in input order. Closing the
+    generator early waits for the queries already in flight.
+    
+    Args:
+        names: Domain names to resolve
+        qtype: Query type for every name
+        concurrency: Maximum queries in flight
+        pool: Upstream pool to use (a private pool is created if None)
+        validator: DNSSEC validator to apply to every response
+        
+    Yields:
+        One Resolution per name
+
+    Raises:
+        ValueError: If concurrency is less than 1
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, not {concurrency}")
+    own_pool = pool is None
+    if pool is None:
+        pool = UpstreamPool(max_idle=concurrency)
+
+    def resolve(name: str) -> Resolution:
+        try:
+            if validator is None:
+                return Resolution(name, qtype, pool.query(name, qtype), None)
+            response = pool.query(name, qtype, want_dnssec=True)
+            return Resolution(name, qtype, validator.apply(response), None)
+        except Exception as e:
+            return Resolution(name, qtype, None, e)
+
+    pending: Dict[Future, str] = {}
+    names_iter = iter(names)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < concurrency:
+                    name = next(names_iter, None)
+                    if name is None:
+                        exhausted = True
+                        break
+                    pending[executor.submit(resolve, name)] = name
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    yield future.result()
+    finally:
+        if own_pool:
+            pool.close()
+
+
 def run_stub_command(command: str) -> str:
     """Run a shell command and return the output.
     
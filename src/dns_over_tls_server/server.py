@@ -2,17 +2,31 @@
 
 import logging
 import socket
+import ssl
 import sys
+import threading
+import time
 from typing import Optional
 
+import dns.rdatatype
+
 from .resolvers import (
     resolve_with_curl,
     resolve_with_doh,
     resolve_with_kdig,
+    resolve_with_pool,
     resolve_with_ssock,
 )
+from .capture import OUTCOME_ERROR, OUTCOME_UNCACHED, CaptureWriter
+from .connections import ConnectionTracker, add_keepalive
+from .profiling import Profiler
+from .tls import ServerTLSContext
+from .tracing import Trace, Tracer
 import validators
 
+# Longest domain name (253 characters) plus a line terminator
+_MAX_QUERY_SIZE = 256
+
 
 class DNSToTLSServer:
     """DNS to DNS-over-TLS proxy server."""
@@ -23,20 +37,62 @@ class DNSToTLSServer:
         max_connections: int = 1,
         stub_resolver: str = "doh",
         host: str = "0.0.0.0",
+        tls_certfile: Optional[str] = None,
+        tls_keyfile: Optional[str] = None,
+        tls_ticket_rotation: float = 3600.0,
+        max_clients: int = 1024,
+        idle_timeout: float = 30.0,
+        max_queries_per_connection: int = 1000,
+        drain_timeout: float = 10.0,
+        capture_path: Optional[str] = None,
+        profiler: Optional[Profiler] = None,
+        tracer: Optional[Tracer] = None,
     ):
         """Initialize the DNS-over-TLS server.
         
         Args:
             port: Port to listen on
             max_connections: Maximum concurrent connections
-            stub_resolver: Resolver to use ('doh', 'curl', 'kdig', 'ssock')
+            stub_resolver: Resolver to use ('doh', 'curl', 'kdig', 'ssock', 'pool')
             host: Host to bind to
+            tls_certfile: PEM certificate; enables TLS on the listener when set
+            tls_keyfile: PEM private key for tls_certfile
+            tls_ticket_rotation: Seconds between session-ticket key rotations
+            max_clients: Maximum simultaneously open client connections
+            idle_timeout: Seconds an idle client connection may stay open
+            max_queries_per_connection: Queries served before a connection is closed
+            drain_timeout: Seconds to let in-flight queries finish on shutdown
+            capture_path: File to record every served query to for later replay
+            profiler: Profiler to record per-stage query timings with
+            tracer: Tracer to trace the stages of every query with
         """
         self.port = port
         self.max_connections = max_connections
         self.stub_resolver = stub_resolver
         self.host = host
         self.socket: Optional[socket.socket] = None
+        self.tls: Optional[ServerTLSContext] = None
+        if tls_certfile:
+            self.tls = ServerTLSContext(
+                tls_certfile,
+                tls_keyfile,
+                ticket_rotation=tls_ticket_rotation,
+            )
+        self.drain_timeout = drain_timeout
+        self.connections = ConnectionTracker(
+            max_clients=max_clients,
+            idle_timeout=idle_timeout,
+            max_queries=max_queries_per_connection,
+        )
+        self.profiler = profiler
+        if profiler:
+            profiled = tracer if tracer is not None else Tracer()
+            profiled.add_hook(profiler.record_trace)
+            tracer = profiled
+        self.tracer = tracer
+        self.capture: Optional[CaptureWriter] = None
+        if capture_path:
+            self.capture = CaptureWriter(capture_path)
         self._setup_logging()
 
     def _setup_logging(self) -> None:
@@ -53,6 +109,7 @@ class DNSToTLSServer:
             "curl": resolve_with_curl,
             "kdig": resolve_with_kdig,
             "ssock": resolve_with_ssock,
+            "pool": resolve_with_pool,
         }
         
         if self.stub_resolver not in resolvers:
@@ -60,22 +117,65 @@ class DNSToTLSServer:
         
         return resolvers[self.stub_resolver]
 
-    def _handle_connection(self, connection: socket.socket, client_address: tuple) -> None:
+    def _handle_connection(
+        self,
+        connection: socket.socket,
+        client_address: tuple,
+        accepted_at: Optional[float] = None,
+    ) -> None:
         """Handle a single client connection.
         
         Args:
             connection: Client socket connection
             client_address: Client address tuple
+            accepted_at: perf_counter() value when the connection was accepted;
+                the first query's trace starts there when set
         """
         resolver = self._get_resolver()
+        queries = 0
+        tracer = self.tracer
+        trace: Optional[Trace] = None
+        if tracer and accepted_at is not None:
+            trace = tracer.start(client_address[0], accepted_at)
+            trace.mark("queue")
         
         try:
-            while True:
-                # Receive query from the user
-                data = connection.recv(16)
+            if self.tls:
+                try:
+                    tls_connection = self.tls.wrap(connection)
+                except (ssl.SSLError, OSError) as e:
+                    logging.warning("TLS handshake with %s failed: %s", client_address, e)
+                    return
+                self.connections.replace(connection, tls_connection)
+                connection = tls_connection
+                if trace:
+                    trace.mark("handshake")
+
+            # Serve queries until the client closes the connection, so that
+            # clients can reuse it per RFC 7766 section 6.2.1
+            while not self.connections.draining.is_set():
+                # Receive query from the user, closing the connection when idle
+                idle_timeout = self.connections.current_idle_timeout()
+                if idle_timeout <= 0:
+                    # Draining; a zero timeout would make the socket non-blocking
+                    break
+                connection.settimeout(idle_timeout)
+                try:
+                    data = connection.recv(_MAX_QUERY_SIZE)
+                except socket.timeout:
+                    logging.info("Idle timeout for %s", client_address)
+                    break
                 if not data:
                     logging.warning("No data from %s", client_address)
                     break
+                self.connections.set_busy(connection, True)
+                received_at = time.time()
+                started = time.perf_counter()
+                if tracer:
+                    if trace is None:
+                        trace = tracer.start(client_address[0], started)
+                    else:
+                        trace.mark("recv")
 
                 try:
                     query = data.strip().decode("utf-8")
@@ -84,30 +184,86 @@ class DNSToTLSServer:
                     break
 
                 logging.info("Query received for %s", query)
+                if trace:
+                    trace.query = query
+                    trace.mark("decode")
                 
                 if not validators.domain(query):
                     logging.warning("Invalid URL %s from %s", query, client_address)
                     break
+                if trace:
+                    trace.mark("validate")
 
                 # Resolve the query
                 try:
                     result = resolver(query)
+                    if trace:
+                        trace.mark("resolve")
                     logging.info("Resolution result: %s", result)
                 except Exception as e:
                     logging.error("Resolution failed for %s: %s", query, e)
+                    if tracer and trace:
+                        trace.mark("resolve")
+                        trace.error = str(e) or type(e).__name__
+                        tracer.finish(trace)
+                        trace = None
+                    self._capture(received_at, client_address, query, started, OUTCOME_ERROR)
                     break
 
                 # Send response back to client
                 if isinstance(result, str):
                     result = result.encode("utf-8")
+                result = add_keepalive(result, self.connections.current_idle_timeout())
                 connection.sendall(result)
+                if tracer and trace:
+                    trace.mark("send")
+                    tracer.finish(trace)
+                    trace = None
+                self._capture(received_at, client_address, query, started, OUTCOME_UNCACHED)
                 logging.info("Response for query %s sent to %s: %s", query, client_address, result)
+                self.connections.set_busy(connection, False)
+
+                queries += 1
+                if queries >= self.connections.max_queries:
+                    logging.info("Closing %s after %s queries", client_address, queries)
+                    break
 
         except Exception as e:
             logging.error("Error handling connection from %s: %s", client_address, e)
         finally:
+            if tracer:
+                # Connections that closed before a query was resolved are not reported
+                tracer.abandon()
+            self.connections.unregister(connection)
             connection.close()
 
+    def _capture(
+        self,
+        received_at: float,
+        client_address: tuple,
+        query: str,
+        started: float,
+        outcome: int,
+    ) -> None:
+        """Record a served query if capture is enabled.
+        
+        Args:
+            received_at: Wall-clock time the query was received
+            client_address: Client address tuple
+            query: Queried domain name
+            started: perf_counter() value when the query was received
+            outcome: Capture outcome (see capture.OUTCOME_*)
+        """
+        if self.capture:
+            self.capture.record(
+                received_at,
+                client_address[0],
+                query,
+                dns.rdatatype.A,
+                time.perf_counter() - started,
+                outcome,
+            )
+
     def start(self) -> None:
         """Start the DNS-over-TLS server."""
         # Create a TCP socket
@@ -116,31 +272,61 @@ class DNSToTLSServer:
         # Bind to port
         server_address = (self.host, self.port)
         logging.info(
-            "Starting up %s on %s {port: %s, maxconns: %s, resolver: %s}",
+            "Starting up %s on %s {port: %s, maxconns: %s, resolver: %s, tls: %s}",
             sys.argv[0],
             server_address,
             self.port,
             self.max_connections,
             self.stub_resolver,
+            self.tls is not None,
         )
         
         self.socket.bind(server_address)
         self.socket.listen(self.max_connections)
 
         try:
-            while True:
+            while not self.connections.draining.is_set():
                 # Wait for a connection
-                connection, client_address = self.socket.accept()
-                self._handle_connection(connection, client_address)
+                try:
+                    connection, client_address = self.socket.accept()
+                except OSError:
+                    if self.connections.draining.is_set():
+                        break
+                    raise
+
+                if not self.connections.register(connection):
+                    logging.warning("Refusing connection from %s: server full", client_address)
+                    connection.close()
+                    continue
+
+                threading.Thread(
+                    target=self._handle_connection,
+                    args=(connection, client_address, time.perf_counter()),
+                    daemon=True,
+                ).start()
         except KeyboardInterrupt:
             logging.info("Server shutting down...")
         finally:
             if self.socket:
                 self.socket.close()
+            # Let in-flight queries finish before returning
+            self.connections.drain(self.drain_timeout)
+            if self.capture:
+                self.capture.close()
 
     def stop(self) -> None:
-        """Stop the DNS-over-TLS server."""
+        """Stop the DNS-over-TLS server.
+
+        New connections are refused and idle ones closed; ``start`` returns once
+        in-flight queries have been answered or the drain timeout expires.
+        """
+        self.connections.draining.set()
         if self.socket:
+            try:
+                # Wake up a blocked accept() in the serving thread
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.socket.close()
             self.socket = None
 
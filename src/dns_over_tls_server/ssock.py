@@ -1,27 +1,43 @@
 """SSL socket implementation for DNS-over-TLS."""
 
-import binascii
 import logging
 import socket
 import ssl
-from typing import Union
+import struct
+from typing import Optional, Union
 
 import dns.message
 
+from . import tracing
+
 
 class SSLSocket:
     """SSL socket wrapper for DNS-over-TLS connections."""
 
-    def __init__(self, hostname: str = "1.1.1.1", port: int = 853):
+    def __init__(
+        self,
+        hostname: str = "1.1.1.1",
+        port: int = 853,
+        cafile: str = "/etc/ssl/cert.pem",
+    ):
         """Initialize SSL socket.
         
         Args:
             hostname: DNS server hostname
             port: DNS server port
+            cafile: CA bundle to verify the DNS server with
         """
         self.hostname = hostname
         self.port = port
-        self.context = self._create_ssl_context()
+        self.cafile = cafile
+        self._context: Optional[ssl.SSLContext] = None
+
+    @property
+    def context(self) -> ssl.SSLContext:
+        """SSL context, created on first use so construction stays cheap."""
+        if self._context is None:
+            self._context = self._create_ssl_context()
+        return self._context
 
     def _create_ssl_context(self) -> ssl.SSLContext:
         """Create SSL context with secure defaults.
@@ -29,10 +45,9 @@ class SSLSocket:
         Returns:
             Configured SSL context
         """
-        context = ssl.create_default_context()
         context = ssl.SSLContext(ssl.PROTOCOL_TLS)
         context.verify_mode = ssl.CERT_REQUIRED
-        context.load_verify_locations("/etc/ssl/cert.pem")
+        context.load_verify_locations(self.cafile)
         return context
 
     def connectsend(self, query: str) -> Union[str, bytes]:
@@ -44,19 +59,22 @@ class SSLSocket:
         Returns:
             DNS response as bytes or string
         """
-        # Create a socket and wrap it
+        # Create a socket, connect it and wrap it
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(10)
         
         try:
+            sock.connect((self.hostname, self.port))
+            tracing.mark("upstream_connect")
             wrsock = self.context.wrap_socket(sock, server_hostname=self.hostname)
-            wrsock.connect((self.hostname, self.port))
             cfcert = wrsock.getpeercert()
+            tracing.mark("upstream_handshake")
 
             # Pad and encode and send and receive
             encoded_query = self._padencode(query)
             wrsock.send(encoded_query)
             data = wrsock.recv(4096)
+            tracing.mark("upstream")
             
             logging.debug("Received data: %s", data)
             return data
@@ -73,12 +91,36 @@ class SSLSocket:
         Returns:
             Encoded DNS query as bytes
         """
-        msg = dns.message.make_query(domain, "A")
-        return binascii.hexlify(msg.to_text().encode())
+        # EDNS lets the server add edns-tcp-keepalive to the response
+        wire = dns.message.make_query(domain, "A", use_edns=0).to_wire()
+        return struct.pack("!H", len(wire)) + wire
+
+
+# Global instance for backward compatibility, created on first use
+_ssl_socket: Optional[SSLSocket] = None
+
 
+def _get_ssl_socket() -> SSLSocket:
+    """Return the module-level socket, creating it on first use."""
+    global _ssl_socket
+    if _ssl_socket is None:
+        _ssl_socket = SSLSocket()
+    return _ssl_socket
 
-# Global instance for backward compatibility
-_ssl_socket = SSLSocket()
+
+def configure(hostname: str, port: int = 853, cafile: Optional[str] = None) -> None:
+    """Point the module-level socket at a different DNS server.
+    
+    Args:
+        hostname: DNS server hostname
+        port: DNS server port
+        cafile: CA bundle to verify the DNS server with
+    """
+    global _ssl_socket
+    if cafile is None:
+        _ssl_socket = SSLSocket(hostname, port)
+    else:
+        _ssl_socket = SSLSocket(hostname, port, cafile)
 
 
 def connectsend(query: str) -> Union[str, bytes]:
@@ -90,4 +132,4 @@ def connectsend(query: str) -> Union[str, bytes]:
     Returns:
         DNS response as bytes or string
     """
-    return _ssl_socket.connectsend(query) 
\ No newline at end of file
+    return _get_ssl_socket().connectsend(query) 
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Server-side TLS for the DNS-over-TLS listener (RFC 7858)."""
+
+import logging
+import socket
+import ssl
+import threading
+import time
+from typing import Optional
+
+# Default port for DNS-over-TLS per RFC 7858
+DOT_PORT = 853
+
+# Key exchange and ciphers chosen for cheap handshakes: ECDHE with AEAD
+# ciphers. RSA key exchange and CBC suites are excluded. The key-exchange
+# groups are left at OpenSSL's default, which prefers X25519 over P-256.
+_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+
+
+class ServerTLSContext:
+    """TLS context for client connections with rotating session-ticket keys.
+
+    OpenSSL generates fresh session-ticket keys for every SSL context, so the
+    keys are rotated by rebuilding the context every ``ticket_rotation``
+    seconds. Clients holding a ticket issued within the current window resume
+    without a full handshake; older tickets fall back to a full handshake.
+    """
+
+    def __init__(
+        self,
+        certfile: str,
+        keyfile: Optional[str] = None,
+        ticket_rotation: float = 3600.0,
+        num_tickets: int = 2,
+        handshake_timeout: float = 5.0,
+    ):
+        """Initialize the server TLS context.
+
+        Args:
+            certfile: PEM certificate chain presented to clients
+            keyfile: PEM private key (defaults to the key inside certfile)
+            ticket_rotation: Seconds between session-ticket key rotations
+            num_tickets: TLS 1.3 session tickets issued per handshake
+            handshake_timeout: Seconds a client may take to finish the handshake
+        """
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.ticket_rotation = ticket_rotation
+        self.num_tickets = num_tickets
+        self.handshake_timeout = handshake_timeout
+        self._lock = threading.Lock()
+        self.context = self._create_ssl_context()
+        self._rotated_at = time.monotonic()
+
+    def _create_ssl_context(self) -> ssl.SSLContext:
+        """Create a server SSL context tuned for cheap handshakes.
+
+        Returns:
+            Configured SSL context
+        """
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.set_ciphers(_CIPHERS)
+        context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE
+        context.options |= ssl.OP_NO_COMPRESSION
+        context.options &= ~ssl.OP_NO_TICKET
+        if hasattr(context, "num_tickets"):
+            context.num_tickets = self.num_tickets
+        context.load_cert_chain(self.certfile, self.keyfile)
+        return context
+
+    def current(self) -> ssl.SSLContext:
+        """Return the active context, rotating ticket keys when due.
+
+        Rotation replaces the ticket keys outright, so every outstanding ticket
+        is invalidated at once and all returning clients do a full handshake
+        together right after each rotation. If the new context cannot be
+        built, e.g. while the certificate is being replaced, the previous one
+        stays in use until the next rotation is due.
+
+        Returns:
+            SSL context to use for the next handshake
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rotated_at >= self.ticket_rotation:
+                logging.info("Rotating TLS session-ticket keys")
+                self._rotated_at = now
+                try:
+                    self.context = self._create_ssl_context()
+                except (ssl.SSLError, OSError) as e:
+                    logging.error("TLS context rotation failed, keeping the old keys: %s", e)
+            return self.context
+
+    def wrap(self, connection: socket.socket) -> ssl.SSLSocket:
+        """Perform the server-side handshake on an accepted connection.
+
+        Args:
+            connection: Accepted plaintext client socket
+
+        Returns:
+            TLS-wrapped client socket
+
+        Raises:
+            ssl.SSLError: If the handshake fails
+            socket.timeout: If the client does not finish the handshake in time
+        """
+        previous_timeout = connection.gettimeout()
+        connection.settimeout(self.handshake_timeout)
+        tls_connection = self.current().wrap_socket(connection, server_side=True)
+        tls_connection.settimeout(previous_timeout)
+        if tls_connection.session_reused:
+            logging.debug("Resumed TLS session")
+        return tls_connection
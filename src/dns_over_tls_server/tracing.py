@@ -0,0 +1,215 @@
+"""Per-query stage tracing for latency attribution.
+
+A Trace records a perf_counter() timestamp at each stage boundary while a
+query is served; each stage's duration is measured from the previous
+boundary. The server starts a trace for every query and makes it the
+current trace of the serving thread, so resolvers and the upstream pool can
+mark their own stages with ``mark()`` without it being passed around. When
+no trace is active, ``mark()`` is a no-op.
+
+Finished traces are handed to the Tracer's hooks (e.g. the Profiler's stage
+statistics or a JSONLinesExporter), and traces slower than the threshold
+are logged with their stage breakdown. Queries whose resolution fails are
+finished too, with the error recorded on the trace, so slow failures such
+as upstream timeouts are reported like slow answers.
+
+Stages marked by this package, in order:
+
+    queue               accept until the connection's thread started (first query)
+    handshake           client TLS handshake (first query, TLS listener only)
+    recv                waiting for the query to arrive (first query)
+    decode              decoding the query line
+    validate            checking the domain name
+    upstream_connect    TCP connect to the upstream (new connections only)
+    upstream_handshake  upstream TLS handshake (new connections only)
+    upstream            upstream round trip
+    dnssec              DNSSEC validation (with --dnssec)
+    resolve             rest of the resolver, e.g. encoding the response
+    send                adding keepalive and sending the response
+
+Time spent in ``recv`` depends on the client, so it is excluded from
+``Trace.elapsed`` and from the slow-query threshold.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+# Stages that measure the client rather than the server
+CLIENT_STAGES = frozenset({"recv"})
+
+_current = threading.local()
+
+
+class Trace:
+    """Stage boundary timestamps of one query."""
+
+    __slots__ = ("query", "client", "received_at", "marks", "error")
+
+    def __init__(self, query: str = "", client: str = "", started: Optional[float] = None):
+        """Start a trace.
+
+        Args:
+            query: Queried name, filled in once decoded
+            client: Client address
+            started: perf_counter() value the trace starts at (now if None)
+        """
+        self.query = query
+        self.client = client
+        self.received_at = time.time()
+        self.marks: List[Tuple[str, float]] = [
+            ("start", time.perf_counter() if started is None else started)
+        ]
+        # Why the query failed, or None if it was answered
+        self.error: Optional[str] = None
+
+    def mark(self, stage: str) -> None:
+        """Record the end of a stage."""
+        self.marks.append((stage, time.perf_counter()))
+
+    def stages(self) -> List[Tuple[str, float]]:
+        """Stage durations in seconds, in the order they were marked."""
+        return [
+            (stage, now - previous)
+            for (_, previous), (stage, now) in zip(self.marks, self.marks[1:])
+        ]
+
+    @property
+    def total(self) -> float:
+        """Seconds from the start of the trace to the last mark."""
+        return self.marks[-1][1] - self.marks[0][1]
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent by the server, excluding stages that wait on the client."""
+        return sum(
+            duration for stage, duration in self.stages() if stage not in CLIENT_STAGES
+        )
+
+    def breakdown(self) -> str:
+        """Stage durations formatted for a log line."""
+        return " ".join(f"{stage}={duration * 1e6:.0f}us" for stage, duration in self.stages())
+
+    def as_dict(self) -> Dict[str, object]:
+        """JSON-serializable summary with durations in microseconds."""
+        stages: Dict[str, float] = {}
+        for stage, duration in self.stages():
+            stages[stage] = stages.get(stage, 0.0) + duration * 1e6
+        return {
+            "timestamp": self.received_at,
+            "client": self.client,
+            "query": self.query,
+            "elapsed_us": self.elapsed * 1e6,
+            "stages_us": stages,
+            "error": self.error,
+        }
+
+
+TraceHook = Callable[[Trace], None]
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the trace of the query being served on this thread, if any."""
+    return getattr(_current, "trace", None)
+
+
+def mark(stage: str) -> None:
+    """Mark the end of a stage in the current thread's trace, if any.
+
+    Args:
+        stage: Stage name
+    """
+    trace = getattr(_current, "trace", None)
+    if trace is not None:
+        trace.marks.append((stage, time.perf_counter()))
+
+
+class Tracer:
+    """Start per-query traces and hand finished ones to hooks."""
+
+    def __init__(self, slow_threshold: Optional[float] = None):
+        """Initialize the tracer.
+
+        Args:
+            slow_threshold: Log queries whose elapsed time exceeds this many
+                seconds with their stage breakdown (never if None)
+        """
+        self.slow_threshold = slow_threshold
+        self.hooks: List[TraceHook] = []
+
+    def add_hook(self, hook: TraceHook) -> None:
+        """Call hook with every finished trace.
+
+        Hooks run on the serving thread after the response has been sent, so
+        they should be quick; exceptions are logged and otherwise ignored.
+
+        Args:
+            hook: Callable taking a Trace
+        """
+        self.hooks.append(hook)
+
+    def start(self, client: str = "", started: Optional[float] = None) -> Trace:
+        """Start a trace and make it current on this thread.
+
+        Args:
+            client: Client address
+            started: perf_counter() value the trace starts at (now if None)
+
+        Returns:
+            New trace
+        """
+        trace = Trace(client=client, started=started)
+        _current.trace = trace
+        return trace
+
+    def finish(self, trace: Trace) -> None:
+        """End a trace, run the hooks and log it if it was slow.
+
+        Args:
+            trace: Trace returned by start
+        """
+        _current.trace = None
+        for hook in self.hooks:
+            try:
+                hook(trace)
+            except Exception as e:
+                logging.error("Trace hook %r failed: %s", hook, e)
+        if self.slow_threshold is not None and trace.elapsed > self.slow_threshold:
+            logging.warning(
+                "Slow query %s from %s took %.1fms: %s%s",
+                trace.query,
+                trace.client,
+                trace.elapsed * 1000,
+                trace.breakdown(),
+                "" if trace.error is None else f" (failed: {trace.error})",
+            )
+
+    def abandon(self) -> None:
+        """Drop the current trace without reporting it, e.g. on a closed connection."""
+        _current.trace = None
+
+
+class JSONLinesExporter:
+    """Trace hook writing one JSON object per finished trace."""
+
+    def __init__(self, path: str):
+        """Open the export file for appending.
+
+        Args:
+            path: File to append traces to
+        """
+        self.path = path
+        self._file: TextIO = open(path, "a")
+        self._lock = threading.Lock()
+
+    def __call__(self, trace: Trace) -> None:
+        line = json.dumps(trace.as_dict())
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        """Flush and close the export file."""
+        with self._lock:
+            self._file.close()
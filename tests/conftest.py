@@ -0,0 +1,110 @@
+"""Shared fixtures for DNS-over-TLS server tests."""
+
+import shutil
+import socket
+import threading
+import time
+
+import pytest
+
+from dns_over_tls_server import resolvers, ssock
+from dns_over_tls_server.bench.upstream import StandInUpstream, make_self_signed_cert
+from dns_over_tls_server.pool import UpstreamPool
+
+
+@pytest.fixture(scope="session")
+def tls_cert(tmp_path_factory):
+    """Generate a self-signed ECDSA certificate for localhost.
+
+    Returns:
+        Tuple of (certfile, keyfile) paths
+    """
+    if not shutil.which("openssl"):
+        pytest.skip("openssl is required to generate test certificates")
+    return make_self_signed_cert(str(tmp_path_factory.mktemp("tls")))
+
+
+@pytest.fixture
+def dot_upstream(tls_cert):
+    """Run a local DNS-over-TLS upstream for the duration of a test."""
+    with StandInUpstream(*tls_cert) as upstream:
+        yield upstream
+
+
+@pytest.fixture
+def make_pool(tls_cert):
+    """Create upstream pools for stand-in upstreams, closed after the test.
+
+    Returns:
+        Function taking a StandInUpstream (and UpstreamPool keyword arguments)
+        and returning a pool connected to it
+    """
+    pools = []
+
+    def make(upstream, **kwargs):
+        pool = UpstreamPool(
+            upstream.host,
+            upstream.port,
+            server_hostname="localhost",
+            cafile=tls_cert[0],
+            **kwargs,
+        )
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+@pytest.fixture
+def serve():
+    """Run servers in background threads, stopped after the test.
+
+    Returns:
+        Function taking a DNSToTLSServer, starting it and returning the
+        serving thread once the server is listening
+    """
+    running = []
+
+    def start(server):
+        thread = threading.Thread(target=server.start)
+        thread.start()
+        running.append((server, thread))
+        deadline = time.monotonic() + 5
+        while True:
+            listener = server.socket
+            try:
+                if listener and listener.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN):
+                    return thread
+            except OSError:
+                pass
+            assert time.monotonic() < deadline, "server did not start listening"
+            time.sleep(0.01)
+
+    yield start
+    for server, thread in running:
+        server.stop()
+        thread.join(timeout=5)
+
+
+@pytest.fixture
+def use_upstream(tls_cert):
+    """Point the module-level pool and ssock resolvers at a stand-in upstream.
+
+    Returns:
+        Function taking a StandInUpstream; the default upstream is restored
+        after the test
+    """
+
+    def configure(upstream):
+        resolvers.configure_upstream(
+            upstream.host, upstream.port, server_hostname="localhost", cafile=tls_cert[0]
+        )
+
+    yield configure
+    resolvers.configure_dnssec(False)
+    if resolvers._default_pool is not None:
+        resolvers._default_pool.close()
+        resolvers._default_pool = None
+    ssock._ssl_socket = None
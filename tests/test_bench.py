@@ -0,0 +1,177 @@
+"""Unit tests for the benchmark tooling."""
+
+import time
+
+import dns.message
+import dns.rcode
+import pytest
+
+from dns_over_tls_server.bench.loadgen import ServerClient, percentile, run_load, summarize
+from dns_over_tls_server.bench.replay import hit_ratio, replay
+from dns_over_tls_server.bench.upstream import StandInUpstream
+from dns_over_tls_server.capture import (
+    OUTCOME_HIT,
+    OUTCOME_MISS,
+    OUTCOME_UNCACHED,
+    CaptureRecord,
+)
+from dns_over_tls_server.server import DNSToTLSServer
+
+
+@pytest.fixture
+def server(dot_upstream, make_pool, serve):
+    """Run a server resolving through the stand-in upstream."""
+    server = DNSToTLSServer(port=0, host="127.0.0.1", stub_resolver="pool")
+    pool = make_pool(dot_upstream)
+
+    def resolver(query):
+        wire = pool.query(query).to_wire()
+        return len(wire).to_bytes(2, "big") + wire
+
+    server._get_resolver = lambda: resolver
+    serve(server)
+    return server
+
+
+class TestStandInUpstream:
+    """Test cases for StandInUpstream."""
+
+    def test_answers_stable_addresses(self, dot_upstream, make_pool):
+        """Test A and AAAA answers are stable per name."""
+        pool = make_pool(dot_upstream)
+
+        first = pool.query("example.com", "A").answer[0][0].to_text()
+        second = pool.query("example.com", "A").answer[0][0].to_text()
+        other = pool.query("example.org", "A").answer[0][0].to_text()
+        ipv6 = pool.query("example.com", "AAAA").answer[0][0].to_text()
+
+        assert first == second != other
+        assert ipv6.startswith("2001:db8:")
+
+    def test_nxdomain(self, dot_upstream, make_pool):
+        """Test names starting with nx do not exist."""
+        pool = make_pool(dot_upstream)
+        assert pool.query("nxhost.example").rcode() == dns.rcode.NXDOMAIN
+
+    def test_latency(self, tls_cert, make_pool):
+        """Test answers are delayed by the configured latency."""
+        with StandInUpstream(*tls_cert, latency=0.05) as upstream:
+            pool = make_pool(upstream)
+            pool.query("example.com")
+            started = time.perf_counter()
+            pool.query("example.com")
+            elapsed = time.perf_counter() - started
+
+        assert elapsed >= 0.05
+
+    def test_loss(self, tls_cert, make_pool):
+        """Test a dropped query closes the connection unanswered."""
+        with StandInUpstream(*tls_cert, loss=1.0) as upstream:
+            pool = make_pool(upstream)
+            with pytest.raises(OSError):
+                pool.query("example.com")
+
+
+class TestStatistics:
+    """Test cases for latency statistics."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [float(i) for i in range(1, 101)]
+
+        assert percentile(values, 0.50) == 50.0
+        assert percentile(values, 0.99) == 99.0
+        assert percentile(values, 1.0) == 100.0
+        assert percentile([], 0.5) == 0.0
+
+    def test_summarize(self):
+        """Test summaries are reported in milliseconds."""
+        summary = summarize([0.001, 0.003, 0.002])
+
+        assert summary["p50_ms"] == pytest.approx(2.0)
+        assert summary["max_ms"] == pytest.approx(3.0)
+        assert summary["mean_ms"] == pytest.approx(2.0)
+
+
+class TestLoadGenerator:
+    """Test cases for the load generator against a running server."""
+
+    def test_client_query(self, server):
+        """Test a client can resolve names longer than a single short read."""
+        client = ServerClient(server.socket.getsockname())
+
+        wire = client.query("a-rather-long-hostname.bench.example")
+        client.close()
+
+        response = dns.message.from_wire(wire)
+        assert str(response.question[0].name) == "a-rather-long-hostname.bench.example."
+
+    def test_run_load(self, server, dot_upstream):
+        """Test every query is sent and timed across concurrent clients."""
+        names = [f"host{i}.bench.example" for i in range(10)]
+
+        result = run_load(server.socket.getsockname(), names, queries=40, concurrency=4)
+
+        assert len(result.latencies) == 40
+        assert result.errors == 0
+        assert dot_upstream.queries == 40
+
+
+class TestReplay:
+    """Test cases for replaying captures."""
+
+    def test_hit_ratio(self):
+        """Test the hit ratio only counts queries that went through a cache."""
+        records = [
+            CaptureRecord(0.0, "127.0.0.1", "a.example", 1, 0.0, outcome)
+            for outcome in (OUTCOME_HIT, OUTCOME_HIT, OUTCOME_MISS, OUTCOME_UNCACHED)
+        ]
+
+        assert hit_ratio(records) == pytest.approx(2 / 3)
+        assert hit_ratio(records[3:]) is None
+
+    def test_replay(self, server, dot_upstream):
+        """Test a capture is replayed at scaled speed, one connection per client."""
+        records = [
+            CaptureRecord(
+                1000.0 + i * 0.02,
+                f"10.0.0.{i % 3}",
+                f"host{i}.bench.example",
+                1,
+                0.001,
+                OUTCOME_UNCACHED,
+            )
+            for i in range(12)
+        ]
+
+        started = time.perf_counter()
+        report = replay(records, server.socket.getsockname(), speed=2.0)
+        elapsed = time.perf_counter() - started
+
+        assert report["completed"] == 12
+        assert report["errors"] == 0
+        assert report["clients"] == 3
+        assert report["recorded"]["outcomes"] == {"uncached": 12}
+        assert report["recorded"]["hit_ratio"] is None
+        assert elapsed >= 11 * 0.02 / 2.0
+        assert dot_upstream.queries == 12
+
+
+class TestMicrobenchmarks:
+    """Test cases for the microbenchmark suite."""
+
+    def test_time_callable(self):
+        """Test per-call statistics are reported in microseconds."""
+        from dns_over_tls_server.bench.micro import time_callable
+
+        stats = time_callable(lambda: None, repeat=3, min_time=0.01)
+
+        assert stats["loops"] >= 1
+        assert 0 < stats["min_us"] <= stats["median_us"]
+
+    def test_benchmarks_run(self):
+        """Test every hot-path benchmark runs."""
+        from dns_over_tls_server.bench.micro import benchmarks
+
+        for func in benchmarks().values():
+            func()
@@ -0,0 +1,104 @@
+"""Unit tests for query capture files."""
+
+import io
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dns_over_tls_server.capture import (
+    OUTCOME_ERROR,
+    OUTCOME_HIT,
+    OUTCOME_UNCACHED,
+    CaptureWriter,
+    read_capture,
+)
+from dns_over_tls_server.server import DNSToTLSServer
+
+
+class TestCaptureFile:
+    """Test cases for CaptureWriter and read_capture."""
+
+    def test_round_trip(self, tmp_path):
+        """Test records are read back as written."""
+        path = str(tmp_path / "queries.cap")
+        writer = CaptureWriter(path)
+        writer.record(1700000000.25, "127.0.0.1", "example.com", 1, 0.0125, OUTCOME_HIT)
+        writer.record(1700000001.5, "2001:db8::1", "example.org", 28, 0.5, OUTCOME_ERROR)
+        writer.close()
+
+        records = list(read_capture(path))
+
+        assert len(records) == 2
+        assert records[0].timestamp == 1700000000.25
+        assert records[0].client == "127.0.0.1"
+        assert records[0].qname == "example.com"
+        assert records[0].qtype == 1
+        assert records[0].latency == pytest.approx(0.0125)
+        assert records[0].outcome == OUTCOME_HIT
+        assert records[1].client == "2001:db8::1"
+        assert records[1].qtype == 28
+
+    def test_compact(self, tmp_path):
+        """Test an IPv4 record costs 21 bytes plus the name."""
+        path = str(tmp_path / "queries.cap")
+        writer = CaptureWriter(path)
+        writer.record(0.0, "127.0.0.1", "example.com", 1, 0.0, OUTCOME_UNCACHED)
+        writer.close()
+
+        assert (tmp_path / "queries.cap").stat().st_size == 8 + 21 + len("example.com")
+
+    def test_record_after_close(self, tmp_path):
+        """Test records from threads outliving shutdown are dropped."""
+        path = str(tmp_path / "queries.cap")
+        writer = CaptureWriter(path)
+        writer.record(1700000000.0, "127.0.0.1", "example.com", 1, 0.01, OUTCOME_HIT)
+        writer.close()
+
+        writer.record(1700000001.0, "127.0.0.1", "example.org", 1, 0.01, OUTCOME_HIT)
+
+        assert [record.qname for record in read_capture(path)] == ["example.com"]
+
+    def test_not_a_capture(self):
+        """Test other files are rejected."""
+        with pytest.raises(ValueError, match="not a DNS-over-TLS server capture"):
+            list(read_capture(io.BytesIO(b"example.com\n")))
+
+    def test_truncated(self, tmp_path):
+        """Test a partially written record is reported."""
+        path = tmp_path / "queries.cap"
+        writer = CaptureWriter(str(path))
+        writer.record(0.0, "127.0.0.1", "example.com", 1, 0.0, OUTCOME_UNCACHED)
+        writer.close()
+        data = path.read_bytes()
+
+        with pytest.raises(ValueError, match="truncated"):
+            list(read_capture(io.BytesIO(data[:-3])))
+
+
+class TestServerCapture:
+    """Test cases for capturing queries in the server."""
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_queries_captured(self, mock_logging, mock_validators, tmp_path):
+        """Test served and failed queries are recorded."""
+        path = str(tmp_path / "queries.cap")
+        server = DNSToTLSServer(capture_path=path)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = [b"example.com\n", b"example.org\n"]
+        mock_validators.domain.return_value = True
+        mock_resolver = Mock(side_effect=[b"resolved_result", OSError("upstream down")])
+        server._get_resolver = Mock(return_value=mock_resolver)
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+        server.capture.close()
+
+        records = list(read_capture(path))
+        assert [record.qname for record in records] == ["example.com", "example.org"]
+        assert [record.outcome for record in records] == [OUTCOME_UNCACHED, OUTCOME_ERROR]
+        assert all(record.client == "127.0.0.1" for record in records)
+        assert all(record.latency >= 0 for record in records)
+
+    def test_capture_disabled(self):
+        """Test nothing is captured by default."""
+        assert DNSToTLSServer().capture is None
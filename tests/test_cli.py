@@ -0,0 +1,73 @@
+"""Unit tests for the command-line interface."""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from dns_over_tls_server.cli import main
+
+
+class TestResolveCommand:
+    """Test cases for the batch resolve subcommand."""
+
+    def test_resolve_file(self, dot_upstream, tls_cert, tmp_path, capsys):
+        """Test names from a file are written back as JSON lines."""
+        names = tmp_path / "names.txt"
+        names.write_text("example.com\n# comment\n\nnxdomain.example\n")
+        host, port = dot_upstream.address
+
+        with pytest.raises(SystemExit) as exit_info:
+            main([
+                "resolve", str(names),
+                "--upstream", host,
+                "--upstream-port", str(port),
+                "--upstream-hostname", "localhost",
+                "--cafile", tls_cert[0],
+            ])
+
+        assert exit_info.value.code == 0
+        records = {
+            record["name"]: record
+            for record in map(json.loads, capsys.readouterr().out.splitlines())
+        }
+        assert set(records) == {"example.com", "nxdomain.example"}
+        assert records["example.com"]["rcode"] == 0
+        assert len(records["example.com"]["answer"]) == 1
+        assert records["example.com"]["answer"][0].startswith("example.com. 300 IN A 198.18.")
+        assert records["nxdomain.example"]["rcode"] == 3
+
+    def test_resolve_errors(self, tmp_path, capsys):
+        """Test unreachable upstreams are reported per name with a failing exit code."""
+        names = tmp_path / "names.txt"
+        names.write_text("example.com\n")
+
+        with pytest.raises(SystemExit) as exit_info:
+            main(["resolve", str(names), "--upstream", "127.0.0.1", "--upstream-port", "1"])
+
+        assert exit_info.value.code == 1
+        record = json.loads(capsys.readouterr().out)
+        assert record["name"] == "example.com"
+        assert "error" in record
+
+    def test_resolve_zero_concurrency(self, tmp_path, capsys):
+        """Test a concurrency below one is a usage error, not a traceback."""
+        names = tmp_path / "names.txt"
+        names.write_text("example.com\n")
+
+        with pytest.raises(SystemExit) as exit_info:
+            main(["resolve", str(names), "-n", "0"])
+
+        assert exit_info.value.code == 2
+        assert "--concurrency must be at least 1" in capsys.readouterr().err
+
+    @patch("dns_over_tls_server.cli.signal")
+    @patch("dns_over_tls_server.server.DNSToTLSServer")
+    def test_server_arguments(self, mock_server, mock_signal):
+        """Test arguments other than resolve start the server."""
+        main(["--port", "8053", "--stub", "pool"])
+
+        kwargs = mock_server.call_args.kwargs
+        assert kwargs["port"] == 8053
+        assert kwargs["stub_resolver"] == "pool"
+        mock_server.return_value.start.assert_called_once()
@@ -0,0 +1,210 @@
+"""Unit tests for client connection lifecycle management."""
+
+import struct
+from unittest.mock import Mock, patch
+
+import dns.edns
+import dns.message
+import dns.rrset
+import pytest
+
+from dns_over_tls_server.bench.loadgen import ServerClient
+from dns_over_tls_server.connections import (
+    EDNS_TCP_KEEPALIVE,
+    ConnectionTracker,
+    add_keepalive,
+)
+from dns_over_tls_server.server import DNSToTLSServer
+
+
+def _response(use_edns=0):
+    query = dns.message.make_query("example.com", "A", use_edns=use_edns)
+    return dns.message.make_response(query)
+
+
+def _keepalive(wire):
+    message = dns.message.from_wire(wire)
+    for option in message.options:
+        if option.otype == EDNS_TCP_KEEPALIVE:
+            return struct.unpack("!H", option.data)[0]
+    return None
+
+
+class TestConnectionTracker:
+    """Test cases for ConnectionTracker."""
+
+    def test_register_until_full(self):
+        """Test connections are refused once max_clients is reached."""
+        tracker = ConnectionTracker(max_clients=2)
+
+        assert tracker.register(Mock())
+        assert tracker.register(Mock())
+        assert not tracker.register(Mock())
+        assert tracker.active == 2
+
+    def test_unregister_frees_slot(self):
+        """Test closing a connection frees its slot."""
+        tracker = ConnectionTracker(max_clients=1)
+        connection = Mock()
+        tracker.register(connection)
+
+        tracker.unregister(connection)
+
+        assert tracker.active == 0
+        assert tracker.register(Mock())
+
+    def test_idle_timeout_adapts_to_occupancy(self):
+        """Test the idle timeout shrinks as the server fills."""
+        tracker = ConnectionTracker(max_clients=4, idle_timeout=30.0, min_idle_timeout=2.0)
+
+        assert tracker.current_idle_timeout() == 30.0
+        tracker.register(Mock())
+        tracker.register(Mock())
+        assert tracker.current_idle_timeout() == 30.0
+        tracker.register(Mock())
+        assert tracker.current_idle_timeout() == pytest.approx(16.0)
+        tracker.register(Mock())
+        assert tracker.current_idle_timeout() == 2.0
+
+    @patch("dns_over_tls_server.connections.time")
+    def test_full_server_closes_idle_connection(self, mock_time):
+        """Test a new client replaces an idle one instead of being refused."""
+        tracker = ConnectionTracker(max_clients=2, idle_timeout=30.0, min_idle_timeout=1.0)
+        idle, busy = Mock(), Mock()
+        mock_time.monotonic.return_value = 100.0
+        tracker.register(idle)
+        tracker.register(busy)
+        tracker.set_busy(busy, True)
+
+        # Nobody has been idle for longer than the minimum timeout yet
+        assert not tracker.register(Mock())
+        idle.shutdown.assert_not_called()
+
+        mock_time.monotonic.return_value = 105.0
+        assert tracker.register(Mock())
+        idle.shutdown.assert_called_once()
+        busy.shutdown.assert_not_called()
+        assert tracker.active == 2
+
+    @patch("dns_over_tls_server.connections.time")
+    def test_idle_connections_closed_as_timeout_shrinks(self, mock_time):
+        """Test already idle connections are held to the shrunken timeout."""
+        tracker = ConnectionTracker(max_clients=4, idle_timeout=30.0, min_idle_timeout=2.0)
+        first, second = Mock(), Mock()
+        mock_time.monotonic.return_value = 0.0
+        tracker.register(first)
+        mock_time.monotonic.return_value = 10.0
+        tracker.register(second)
+
+        # A third client shrinks the timeout to 16s
+        mock_time.monotonic.return_value = 20.0
+        assert tracker.register(Mock())
+
+        first.shutdown.assert_called_once()
+        second.shutdown.assert_not_called()
+        assert tracker.active == 2
+
+    def test_replace(self):
+        """Test a connection keeps its slot when its socket object changes."""
+        tracker = ConnectionTracker()
+        raw, wrapped = Mock(), Mock()
+        tracker.register(raw)
+
+        tracker.replace(raw, wrapped)
+        tracker.unregister(wrapped)
+
+        assert tracker.active == 0
+
+    def test_drain_wakes_idle_connections(self):
+        """Test draining shuts down idle connections but not busy ones."""
+        tracker = ConnectionTracker()
+        idle, busy = Mock(), Mock()
+        tracker.register(idle)
+        tracker.register(busy)
+        tracker.set_busy(busy, True)
+
+        assert not tracker.drain(timeout=0.01)
+
+        idle.shutdown.assert_called_once()
+        busy.shutdown.assert_not_called()
+        assert not tracker.register(Mock())
+        assert tracker.current_idle_timeout() == 0.0
+
+    def test_drain_empty(self):
+        """Test draining with no connections completes immediately."""
+        tracker = ConnectionTracker()
+        assert tracker.drain(timeout=0.01)
+
+
+class TestAddKeepalive:
+    """Test cases for add_keepalive."""
+
+    def test_adds_option(self):
+        """Test the timeout is advertised in units of 100 milliseconds."""
+        wire = add_keepalive(_response().to_wire(), 12.5)
+        assert _keepalive(wire) == 125
+
+    def test_framed_response(self):
+        """Test a length-prefixed response keeps a correct prefix."""
+        wire = _response().to_wire()
+        framed = add_keepalive(struct.pack("!H", len(wire)) + wire, 3.0)
+
+        assert struct.unpack("!H", framed[:2])[0] == len(framed) - 2
+        assert _keepalive(framed[2:]) == 30
+
+    def test_replaces_existing_option(self):
+        """Test an existing keepalive option is not duplicated."""
+        wire = add_keepalive(add_keepalive(_response().to_wire(), 5.0), 1.0)
+        message = dns.message.from_wire(wire)
+
+        assert len(message.options) == 1
+        assert _keepalive(wire) == 10
+
+    def test_keeps_records_and_options(self):
+        """Test answers and other EDNS options survive the rewrite."""
+        response = _response()
+        response.answer.append(
+            dns.rrset.from_text("example.com.", 300, "IN", "A", "192.0.2.1", "192.0.2.2")
+        )
+        response.use_edns(0, options=[dns.edns.GenericOption(dns.edns.NSID, b"proxy")])
+
+        message = dns.message.from_wire(add_keepalive(response.to_wire(), 2.0))
+
+        assert message.answer == response.answer
+        assert [option.otype for option in message.options] == [
+            dns.edns.NSID,
+            EDNS_TCP_KEEPALIVE,
+        ]
+
+    def test_truncated_response(self):
+        """Test a truncated DNS message is returned unchanged."""
+        wire = _response().to_wire()[:-3]
+        assert add_keepalive(wire, 5.0) == wire
+
+    def test_without_edns(self):
+        """Test responses without an OPT record are unchanged."""
+        wire = _response(use_edns=False).to_wire()
+        assert add_keepalive(wire, 5.0) == wire
+
+    def test_non_dns_response(self):
+        """Test text responses from the command-line stubs are unchanged."""
+        assert add_keepalive(b"resolved_result", 5.0) == b"resolved_result"
+
+
+class TestKeepaliveServed:
+    """Test the keepalive option reaches clients through a running server."""
+
+    @pytest.mark.parametrize("stub", ["pool", "ssock"])
+    def test_served_response_carries_keepalive(self, stub, dot_upstream, use_upstream, serve):
+        """Test upstream queries use EDNS so responses can carry the option."""
+        use_upstream(dot_upstream)
+        server = DNSToTLSServer(
+            port=0, host="127.0.0.1", stub_resolver=stub, idle_timeout=12.5
+        )
+        serve(server)
+
+        client = ServerClient(server.socket.getsockname())
+        wire = client.query("example.com")
+        client.close()
+
+        assert _keepalive(wire) == 125
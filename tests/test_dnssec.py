@@ -0,0 +1,360 @@
+"""Unit tests for DNSSEC validation."""
+
+import json
+import threading
+
+import dns.dnssec
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdata
+import dns.rdatatype
+import dns.rrset
+import dns.zone
+import pytest
+
+from dns_over_tls_server import resolvers
+from dns_over_tls_server.bench.upstream import StandInUpstream
+from dns_over_tls_server.cli import main
+from dns_over_tls_server.dnssec import (
+    BOGUS,
+    INSECURE,
+    SECURE,
+    DNSSECValidator,
+    load_trust_anchors,
+)
+from dns_over_tls_server.pool import UpstreamPool
+
+pytest.importorskip("cryptography", reason="cryptography is required for DNSSEC")
+
+SOA = "@ 300 IN SOA ns hostmaster 1 7200 900 1209600 300\n@ 300 IN NS ns\n"
+
+
+def _signed_zone(origin, records, key=None):
+    """Build a zone from text and sign it with an Ed25519 KSK (fresh if None)."""
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    key = key or ed25519.Ed25519PrivateKey.generate()
+    dnskey = dns.dnssec.make_dnskey(key.public_key(), "ED25519", flags=257)
+    zone = dns.zone.from_text(SOA + records, origin, relativize=False)
+    dns.dnssec.sign_zone(zone, keys=[(key, dnskey)], lifetime=3600)
+    return zone, dns.dnssec.make_ds(origin, dnskey, "SHA256")
+
+
+@pytest.fixture(scope="module")
+def zones():
+    """A signed example. zone with a secure and an insecure delegation.
+
+    Returns:
+        Tuple of (zones, trust anchor DS RRset for example.)
+    """
+    child, child_ds = _signed_zone(
+        "sub.example.",
+        "www 300 IN A 192.0.2.2\n" + "".join(f"h{i} 300 IN A 192.0.2.{i}\n" for i in range(32)),
+    )
+    island, _ = _signed_zone("island.example.", "www 300 IN A 192.0.2.3\n")
+    parent, parent_ds = _signed_zone(
+        "example.",
+        "www 300 IN A 192.0.2.1\n"
+        "tampered 300 IN A 192.0.2.4\n"
+        "sub 300 IN NS ns.sub\n"
+        f"sub 300 IN DS {child_ds.to_text()}\n"
+        "island 300 IN NS ns.island\n",
+    )
+    # Change the record after signing so its RRSIG no longer matches
+    rdataset = parent.find_rdataset("tampered.example.", "A")
+    rdataset.clear()
+    rdataset.add(dns.rdata.from_text("IN", "A", "192.0.2.99"))
+    anchor = dns.rrset.from_rdata_list("example.", 300, [parent_ds])
+    return [parent, child, island], anchor
+
+
+@pytest.fixture
+def signed_upstream(tls_cert, zones):
+    """Run a local DNS-over-TLS upstream serving the signed zones."""
+    with StandInUpstream(*tls_cert, zones=zones[0]) as upstream:
+        yield upstream
+
+
+@pytest.fixture
+def pool(signed_upstream, tls_cert):
+    host, port = signed_upstream.address
+    pool = UpstreamPool(hostname=host, port=port, server_hostname="localhost", cafile=tls_cert[0])
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def validator(pool, zones):
+    return DNSSECValidator(
+        lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True),
+        [zones[1]],
+    )
+
+
+class TestDNSSECValidator:
+    """Test cases for DNSSECValidator."""
+
+    def test_secure_answer(self, pool, validator):
+        """Test a signed answer from the anchored zone gets the AD flag."""
+        response = validator.apply(pool.query("www.example.", want_dnssec=True))
+
+        assert response.rcode() == dns.rcode.NOERROR
+        assert response.flags & dns.flags.AD
+        assert response.answer[0][0].to_text() == "192.0.2.1"
+
+    def test_secure_delegation(self, pool, validator):
+        """Test the chain of trust is followed through a signed DS record."""
+        response = pool.query("www.sub.example.", want_dnssec=True)
+
+        assert validator.validate(response) == SECURE
+
+    def test_tampered_answer_is_bogus(self, pool, validator):
+        """Test an answer whose signature does not match becomes SERVFAIL."""
+        response = pool.query("tampered.example.", want_dnssec=True)
+
+        assert validator.validate(response) == BOGUS
+        failure = validator.apply(response)
+        assert failure.rcode() == dns.rcode.SERVFAIL
+        assert not failure.answer
+
+    def test_unsigned_answer_is_insecure(self, pool, validator):
+        """Test answers without signatures are passed on without AD."""
+        response = pool.query("example.com.", want_dnssec=True)
+
+        assert validator.validate(response) == INSECURE
+        assert not validator.apply(response).flags & dns.flags.AD
+
+    def test_insecure_delegation(self, pool, validator):
+        """Test a signed zone without a DS record in its parent is insecure."""
+        response = pool.query("www.island.example.", want_dnssec=True)
+
+        assert validator.validate(response) == INSECURE
+
+    def test_signed_nxdomain_is_insecure(self, pool, validator):
+        """Test a signed denial of existence validates but does not get AD."""
+        response = pool.query("missing.example.", want_dnssec=True)
+
+        assert response.rcode() == dns.rcode.NXDOMAIN
+        assert validator.validate(response) == INSECURE
+
+    def test_tampered_nxdomain_is_bogus(self, pool, validator):
+        """Test the signatures of a denial of existence are still checked."""
+        response = pool.query("missing.example.", want_dnssec=True)
+        soa = next(rrset for rrset in response.authority if rrset.rdtype == dns.rdatatype.SOA)
+        serial = soa[0].replace(serial=2)
+        soa.clear()
+        soa.add(serial)
+
+        assert validator.validate(response) == BOGUS
+
+    def test_stripped_signatures_are_bogus(self, pool, validator):
+        """Test an unsigned answer inside a secure zone is not passed as insecure."""
+        response = pool.query("www.example.", want_dnssec=True)
+        response.answer = [dns.rrset.from_text("www.example.", 300, "IN", "A", "6.6.6.6")]
+
+        assert validator.validate(response) == BOGUS
+
+    def test_signer_outside_secure_zone_is_bogus(self, pool, zones):
+        """Test a signature by an unvalidated zone cannot vouch for a secure one."""
+        child_anchor = dns.rrset.from_rdata_list(
+            "sub.example.", 300, [pool.query("sub.example.", "DS", want_dnssec=True).answer[0][0]]
+        )
+        validator = DNSSECValidator(
+            lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True), [child_anchor]
+        )
+        response = pool.query("www.sub.example.", want_dnssec=True)
+        response.answer = [
+            dns.rrset.from_text("www.sub.example.", 300, "IN", "A", "6.6.6.6"),
+            dns.rrset.from_text(
+                "www.sub.example.", 300, "IN", "RRSIG",
+                "A 15 3 300 20300101000000 20200101000000 1234 example. AAAA",
+            ),
+        ]
+
+        assert validator.validate(response) == BOGUS
+
+    def test_grandparent_ds_denial_is_bogus(self, tls_cert):
+        """Test a DS denial replayed from a zone above the parent is rejected."""
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+
+        grandparent_key = ed25519.Ed25519PrivateKey.generate()
+        child, child_ds = _signed_zone("sub.a.example.", "www 300 IN A 192.0.2.1\n")
+        parent, parent_ds = _signed_zone(
+            "a.example.", f"sub 300 IN NS ns.sub\nsub 300 IN DS {child_ds.to_text()}\n"
+        )
+        grandparent, grandparent_ds = _signed_zone(
+            "example.",
+            f"a 300 IN NS ns.a\na 300 IN DS {parent_ds.to_text()}\n",
+            grandparent_key,
+        )
+        upstream = StandInUpstream(*tls_cert, zones=[grandparent, parent, child])
+
+        # An opt-out NSEC3 span of example. covering every hash
+        name = dns.name.from_text("sub.a.example.")
+        owner = dns.name.from_text("0" * 32, grandparent.origin)
+        nsec3 = dns.rrset.from_text(owner, 300, "IN", "NSEC3", f"1 1 0 - {'V' * 32}")
+        dnskey = grandparent.find_rdataset(grandparent.origin, "DNSKEY")[0]
+        rrsig = dns.dnssec.sign(
+            nsec3, grandparent_key, grandparent.origin, dnskey, lifetime=3600
+        )
+
+        def query(qname, rdtype):
+            request = dns.message.make_query(qname, rdtype, want_dnssec=True)
+            if dns.name.from_text(qname) == name and rdtype == "DS":
+                response = dns.message.make_response(request)
+                response.authority = [nsec3, dns.rrset.from_rdata(owner, 300, rrsig)]
+                return response
+            return upstream.answer(request)
+
+        validator = DNSSECValidator(
+            query, [dns.rrset.from_rdata_list("example.", 300, [grandparent_ds])]
+        )
+        forged = dns.message.make_response(
+            dns.message.make_query("www.sub.a.example.", "A", want_dnssec=True)
+        )
+        forged.answer = [dns.rrset.from_text("www.sub.a.example.", 300, "IN", "A", "6.6.6.6")]
+
+        assert validator.validate(forged) == BOGUS
+
+    def test_unproven_missing_ds_is_bogus(self, pool, zones):
+        """Test a DS query answered without a signed denial breaks the chain."""
+
+        def query(name, rdtype):
+            if name == "sub.example." and rdtype == "DS":
+                request = dns.message.make_query(name, rdtype, want_dnssec=True)
+                return dns.message.make_response(request)
+            return pool.query(name, rdtype, want_dnssec=True)
+
+        validator = DNSSECValidator(query, [zones[1]])
+
+        assert validator.validate(pool.query("www.sub.example.", want_dnssec=True)) == BOGUS
+
+    def test_bogus_zone_is_cached(self, pool, zones):
+        """Test a broken chain of trust is not rebuilt for every answer."""
+        _, other_ds = _signed_zone("example.", "")
+        validator = DNSSECValidator(
+            lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True),
+            [dns.rrset.from_rdata_list("example.", 300, [other_ds])],
+        )
+        response = pool.query("www.example.", want_dnssec=True)
+        validator.validate(response)
+        upstream_queries = validator.stats["upstream_queries"]
+
+        assert validator.validate(response) == BOGUS
+        assert validator.stats["upstream_queries"] == upstream_queries
+
+    def test_concurrent_chain_built_once(self, pool, validator):
+        """Test concurrent answers from a cold zone share one chain build."""
+        names = [f"h{i}.sub.example." for i in range(32)]
+
+        results = list(resolvers.resolve_many(names, pool=pool, validator=validator))
+
+        assert all(result.response.flags & dns.flags.AD for result in results)
+        # DNSKEY of example., DS and DNSKEY of sub.example.
+        assert validator.stats["upstream_queries"] == 3
+
+    def test_waiting_for_chain_is_bounded(self, pool, zones):
+        """Test waiting on a chain build that never finishes fails instead of hanging."""
+        validator = DNSSECValidator(
+            lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True),
+            [zones[1]],
+            build_timeout=0.05,
+        )
+        # Another thread stuck building the anchored zone
+        validator._building[dns.name.from_text("example.")] = threading.Event()
+
+        assert validator.validate(pool.query("www.example.", want_dnssec=True)) == BOGUS
+
+    def test_untrusted_anchor_is_bogus(self, pool, zones):
+        """Test a zone whose keys do not match the trust anchor is bogus."""
+        _, other_ds = _signed_zone("example.", "")
+        validator = DNSSECValidator(
+            lambda name, rdtype: pool.query(name, rdtype, want_dnssec=True),
+            [dns.rrset.from_rdata_list("example.", 300, [other_ds])],
+        )
+
+        assert validator.validate(pool.query("www.example.", want_dnssec=True)) == BOGUS
+
+    def test_warm_zone_is_cached(self, pool, validator, signed_upstream):
+        """Test a validated chain and signatures are reused across answers."""
+        validator.validate(pool.query("www.sub.example.", want_dnssec=True))
+        upstream_queries = validator.stats["upstream_queries"]
+        signature_misses = validator.stats["signature_misses"]
+
+        response = pool.query("www.sub.example.", want_dnssec=True)
+        queries = signed_upstream.queries
+        assert validator.validate(response) == SECURE
+
+        assert signed_upstream.queries == queries
+        assert validator.stats["upstream_queries"] == upstream_queries
+        assert validator.stats["signature_misses"] == signature_misses
+        assert validator.stats["zone_hits"] >= 1
+        assert validator.stats["signature_hits"] >= 1
+
+
+class TestTrustAnchors:
+    """Test cases for load_trust_anchors."""
+
+    def test_load(self, tmp_path, zones):
+        """Test DS records are read from a master file."""
+        path = tmp_path / "anchors"
+        path.write_text(zones[1].to_text() + "\n")
+
+        assert load_trust_anchors(str(path)) == [zones[1]]
+
+    def test_no_anchors(self, tmp_path):
+        """Test a file without DS records is rejected."""
+        path = tmp_path / "anchors"
+        path.write_text("example. 300 IN A 192.0.2.1\n")
+
+        with pytest.raises(ValueError):
+            load_trust_anchors(str(path))
+
+
+class TestResolveWithPool:
+    """Test DNSSEC validation in the pool resolver."""
+
+    def test_configure_dnssec(self, signed_upstream, use_upstream, zones):
+        """Test the pool resolver validates once DNSSEC is configured."""
+        use_upstream(signed_upstream)
+        resolvers.configure_dnssec(trust_anchors=[zones[1]])
+
+        secure = dns.message.from_wire(resolvers.resolve_with_pool("www.example.")[2:])
+        bogus = dns.message.from_wire(resolvers.resolve_with_pool("tampered.example.")[2:])
+
+        assert secure.flags & dns.flags.AD
+        assert bogus.rcode() == dns.rcode.SERVFAIL
+
+
+class TestResolveCommand:
+    """Test DNSSEC validation in the batch resolver."""
+
+    def test_resolve_dnssec(self, signed_upstream, tls_cert, zones, tmp_path, capsys):
+        """Test --dnssec reports AD and turns bogus answers into SERVFAIL."""
+        names = tmp_path / "names.txt"
+        names.write_text("www.example.\ntampered.example.\nexample.com.\n")
+        anchors = tmp_path / "anchors"
+        anchors.write_text(zones[1].to_text() + "\n")
+        host, port = signed_upstream.address
+
+        with pytest.raises(SystemExit) as exit_info:
+            main([
+                "resolve", str(names),
+                "--upstream", host,
+                "--upstream-port", str(port),
+                "--upstream-hostname", "localhost",
+                "--cafile", tls_cert[0],
+                "--dnssec",
+                "--trust-anchor", str(anchors),
+            ])
+
+        assert exit_info.value.code == 0
+        records = {
+            record["name"]: record
+            for record in map(json.loads, capsys.readouterr().out.splitlines())
+        }
+        assert records["www.example."]["ad"] is True
+        assert records["tampered.example."]["rcode"] == dns.rcode.SERVFAIL
+        assert records["example.com."]["ad"] is False
@@ -0,0 +1,66 @@
+"""Unit tests for pooled upstream connections."""
+
+from unittest.mock import Mock
+
+import dns.rcode
+import pytest
+
+from dns_over_tls_server.pool import UpstreamPool
+
+
+class TestUpstreamPool:
+    """Test cases for UpstreamPool."""
+
+    def test_query(self, dot_upstream, make_pool):
+        """Test resolving a name over the pool."""
+        pool = make_pool(dot_upstream)
+
+        response = pool.query("example.com", "A")
+
+        assert response.rcode() == dns.rcode.NOERROR
+        assert response.answer[0][0].to_text().startswith("198.18.")
+        pool.close()
+
+    def test_connection_reused(self, dot_upstream, make_pool):
+        """Test sequential queries share one upstream connection."""
+        pool = make_pool(dot_upstream)
+
+        for _ in range(5):
+            pool.query("example.com")
+
+        assert dot_upstream.connections == 1
+        assert dot_upstream.queries == 5
+        pool.close()
+
+    def test_stale_connection_retried(self, dot_upstream, make_pool):
+        """Test a pooled connection closed while idle is replaced transparently."""
+        pool = make_pool(dot_upstream)
+        pool.query("example.com")
+        pool._idle[0].sock.close()
+
+        response = pool.query("example.com")
+
+        assert response.answer
+        assert dot_upstream.connections == 2
+        pool.close()
+
+    def test_connect_failure_not_retried(self):
+        """Test a failing fresh connection raises immediately."""
+        pool = UpstreamPool()
+        pool._connect = Mock(side_effect=ConnectionRefusedError())
+
+        with pytest.raises(ConnectionRefusedError):
+            pool.query("example.com")
+
+        pool._connect.assert_called_once()
+
+    def test_max_idle(self, dot_upstream, make_pool):
+        """Test connections beyond max_idle are closed when released."""
+        pool = make_pool(dot_upstream, max_idle=1)
+
+        with pool.acquire() as first, pool.acquire() as second:
+            assert first is not second
+
+        assert len(pool._idle) == 1
+        pool.close()
+        assert not pool._idle
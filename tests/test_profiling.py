@@ -0,0 +1,108 @@
+"""Unit tests for runtime profiling."""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dns_over_tls_server.profiling import Profiler
+from dns_over_tls_server.server import DNSToTLSServer
+
+
+class TestProfiler:
+    """Test cases for Profiler."""
+
+    def test_record_stages(self):
+        """Test stage durations are measured from the previous boundary."""
+        profiler = Profiler()
+
+        profiler.record_stages([("received", 1.0), ("decode", 1.5), ("resolve", 3.5)])
+        profiler.record_stages([("received", 2.0), ("decode", 2.25), ("resolve", 2.75)])
+
+        report = profiler.stage_report()
+        assert list(report) == ["decode", "resolve"]
+        assert report["decode"]["count"] == 2
+        assert report["decode"]["mean_us"] == pytest.approx(375000.0)
+        assert report["resolve"]["max_us"] == pytest.approx(2000000.0)
+
+    def test_sampling_covers_other_threads(self, tmp_path):
+        """Test samples include stacks of threads other than the caller."""
+        profiler = Profiler(output_dir=str(tmp_path), interval=0.001)
+        stop = threading.Event()
+
+        def busy_worker():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_worker)
+        worker.start()
+        profiler.toggle()
+        time.sleep(0.05)
+        profiler.toggle()
+        stop.set()
+        worker.join()
+
+        dumps = list(tmp_path.iterdir())
+        assert len(dumps) == 1
+        assert "busy_worker" in dumps[0].read_text()
+        assert not profiler.sampling
+
+    def test_stop_when_not_sampling(self, tmp_path):
+        """Test stopping an idle profiler writes nothing."""
+        profiler = Profiler(output_dir=str(tmp_path))
+        assert profiler.stop_sampling() is None
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="requires SIGUSR1")
+    def test_signal_toggles_sampling(self, tmp_path):
+        """Test SIGUSR1 starts and stops sampling."""
+        profiler = Profiler(output_dir=str(tmp_path))
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            profiler.install_signal_handler(signal.SIGUSR1)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.01)
+            assert profiler.sampling
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.01)
+            assert not profiler.sampling
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_server_records_stages(self, mock_logging, mock_validators):
+        """Test the server records per-stage timings for served queries."""
+        profiler = Profiler()
+        server = DNSToTLSServer(profiler=profiler)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = [b"example.com\n", b""]
+        mock_validators.domain.return_value = True
+        server._get_resolver = Mock(return_value=Mock(return_value=b"resolved_result"))
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        report = profiler.stage_report()
+        assert list(report) == ["decode", "validate", "resolve", "send"]
+        assert all(stats["count"] == 1 for stats in report.values())
+
+
+class TestLazyStartup:
+    """Test cases for import-time work."""
+
+    def test_import_is_lazy(self):
+        """Test importing the package loads no submodules and no CA bundle."""
+        code = (
+            "import sys, dns_over_tls_server;"
+            "assert 'dns_over_tls_server.server' not in sys.modules;"
+            "from dns_over_tls_server import ssock;"
+            "assert ssock._ssl_socket is None;"
+            "assert ssock.SSLSocket(cafile='/nonexistent')._context is None;"
+            "assert callable(dns_over_tls_server.resolve_many)"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
@@ -8,6 +8,8 @@ from dns_over_tls_server.resolvers import (
     resolve_with_doh,
     resolve_with_curl,
     resolve_with_kdig,
+    resolve_many,
+    resolve_with_pool,
     resolve_with_ssock,
     run_stub_command,
 )
@@ -88,4 +90,75 @@ class TestResolvers:
         )
         
         with pytest.raises(subprocess.CalledProcessError):
-            run_stub_command("test_command") 
\ No newline at end of file
+            run_stub_command("test_command")
+
+    @patch("dns_over_tls_server.resolvers.get_default_pool")
+    def test_resolve_with_pool(self, mock_get_default_pool):
+        """Test pool resolver returns a length-prefixed wire response."""
+        mock_response = Mock()
+        mock_response.to_wire.return_value = b"wire"
+        mock_get_default_pool.return_value.query.return_value = mock_response
+        
+        result = resolve_with_pool("example.com")
+        
+        mock_get_default_pool.return_value.query.assert_called_once_with("example.com")
+        assert result == b"\x00\x04wire"
+
+    def test_resolve_many(self):
+        """Test every name is resolved and failures are reported per name."""
+        mock_pool = Mock()
+
+        def query(name, qtype):
+            if name == "bad.example":
+                raise OSError("connection reset")
+            return name.upper()
+
+        mock_pool.query.side_effect = query
+        names = ["a.example", "bad.example", "b.example", "c.example"]
+        
+        results = {r.name: r for r in resolve_many(names, "AAAA", concurrency=2, pool=mock_pool)}
+        
+        assert set(results) == set(names)
+        assert results["a.example"].response == "A.EXAMPLE"
+        assert results["a.example"].qtype == "AAAA"
+        assert isinstance(results["bad.example"].error, OSError)
+        assert results["bad.example"].response is None
+        mock_pool.close.assert_not_called()
+
+    def test_resolve_many_streams_input(self):
+        """Test names are consumed lazily, bounded by the concurrency limit."""
+        consumed = []
+
+        def names():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"host{i}.example"
+
+        mock_pool = Mock()
+        mock_pool.query.return_value = "ok"
+        
+        results = resolve_many(names(), concurrency=4, pool=mock_pool)
+        next(results)
+        
+        assert len(consumed) <= 8
+        results.close()
+
+    def test_resolve_many_rejects_zero_concurrency(self):
+        """Test a concurrency below one is rejected."""
+        with pytest.raises(ValueError):
+            next(resolve_many(["a.example"], concurrency=0, pool=Mock()))
+
+    def test_resolve_many_over_upstream(self, dot_upstream, tls_cert):
+        """Test resolving a batch against a local DNS-over-TLS upstream."""
+        from dns_over_tls_server.pool import UpstreamPool
+
+        host, port = dot_upstream.address
+        pool = UpstreamPool(host, port, server_hostname="localhost", cafile=tls_cert[0])
+        names = [f"host{i}.example" for i in range(50)]
+        
+        results = list(resolve_many(names, concurrency=8, pool=pool))
+        pool.close()
+        
+        assert sorted(r.name for r in results) == sorted(names)
+        assert all(r.error is None for r in results)
+        assert dot_upstream.connections <= 8
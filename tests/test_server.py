@@ -1,5 +1,9 @@
 """Unit tests for DNS-over-TLS server."""
 
+import socket
+import threading
+import time
+
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 
@@ -169,13 +173,16 @@ class TestDNSToTLSServer:
     def test_stop_server(self):
         """Test stopping the server."""
         server = DNSToTLSServer()
-        server.socket = Mock()
+        mock_socket = Mock()
+        server.socket = mock_socket
         
         server.stop()
         
-        # Verify socket was closed
-        server.socket.close.assert_called_once()
+        # Verify socket was shut down and closed, and new connections refused
+        mock_socket.shutdown.assert_called_once()
+        mock_socket.close.assert_called_once()
         assert server.socket is None
+        assert server.connections.draining.is_set()
 
     def test_stop_server_no_socket(self):
         """Test stopping server when no socket exists."""
@@ -184,4 +191,92 @@ class TestDNSToTLSServer:
         
         # Should not raise an exception
         server.stop()
-        assert server.socket is None 
\ No newline at end of file
+        assert server.socket is None
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_handle_connection_idle_timeout(self, mock_logging, mock_validators):
+        """Test an idle connection is closed when its timeout expires."""
+        server = DNSToTLSServer(idle_timeout=7.0)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = socket.timeout()
+        mock_resolver = Mock()
+        server._get_resolver = Mock(return_value=mock_resolver)
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        mock_connection.settimeout.assert_called_once_with(7.0)
+        mock_resolver.assert_not_called()
+        mock_connection.close.assert_called_once()
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_handle_connection_max_queries(self, mock_logging, mock_validators):
+        """Test a connection is closed after its query limit."""
+        server = DNSToTLSServer(max_queries_per_connection=2)
+        mock_connection = Mock()
+        mock_connection.recv.return_value = b"example.com\n"
+        mock_validators.domain.return_value = True
+        mock_resolver = Mock(return_value="resolved_result")
+        server._get_resolver = Mock(return_value=mock_resolver)
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        assert mock_resolver.call_count == 2
+        assert mock_connection.sendall.call_count == 2
+        mock_connection.close.assert_called_once()
+
+    @patch("dns_over_tls_server.server.socket")
+    @patch("dns_over_tls_server.server.logging")
+    def test_start_refuses_when_full(self, mock_logging, mock_socket):
+        """Test connections beyond max_clients are refused."""
+        server = DNSToTLSServer(max_clients=1)
+        server.connections.register(Mock())
+        mock_socket_instance = Mock()
+        mock_socket.socket.return_value = mock_socket_instance
+        mock_connection = Mock()
+        mock_socket_instance.accept.side_effect = [
+            (mock_connection, ("127.0.0.1", 12345)),
+            KeyboardInterrupt(),
+        ]
+        server.drain_timeout = 0.01
+
+        with patch.object(server, "_handle_connection") as mock_handle:
+            server.start()
+
+        mock_handle.assert_not_called()
+        mock_connection.close.assert_called_once()
+
+    @patch("dns_over_tls_server.server.validators")
+    def test_stop_drains_in_flight_queries(self, mock_validators, serve):
+        """Test stop lets an in-flight query finish and closes idle clients."""
+        mock_validators.domain.return_value = True
+        server = DNSToTLSServer(port=0, host="127.0.0.1")
+        resolving = threading.Event()
+        release = threading.Event()
+
+        def slow_resolver(query):
+            resolving.set()
+            release.wait(5)
+            return b"resolved_result"
+
+        server._get_resolver = Mock(return_value=slow_resolver)
+        serving = serve(server)
+        address = server.socket.getsockname()
+        busy_client = socket.create_connection(address)
+        idle_client = socket.create_connection(address)
+        busy_client.sendall(b"example.com\n")
+        assert resolving.wait(5)
+        while server.connections.active < 2:
+            time.sleep(0.01)
+
+        server.stop()
+        assert idle_client.recv(64) == b""
+        release.set()
+        assert busy_client.recv(64) == b"resolved_result"
+        serving.join(timeout=5)
+
+        assert not serving.is_alive()
+        assert server.connections.active == 0
+        busy_client.close()
+        idle_client.close()
@@ -0,0 +1,29 @@
+"""Unit tests for the SSL socket resolver."""
+
+import struct
+
+import dns.message
+
+from dns_over_tls_server.ssock import SSLSocket
+
+
+class TestSSLSocket:
+    """Test cases for SSLSocket."""
+
+    def test_padencode(self, tls_cert):
+        """Test queries carry the two-byte length prefix of RFC 7858."""
+        encoded = SSLSocket(cafile=tls_cert[0])._padencode("example.com")
+
+        (length,) = struct.unpack("!H", encoded[:2])
+        assert length == len(encoded) - 2
+        message = dns.message.from_wire(encoded[2:])
+        assert str(message.question[0].name) == "example.com."
+
+    def test_connectsend(self, dot_upstream, tls_cert):
+        """Test a query round-trips to a DNS-over-TLS upstream."""
+        ssl_socket = SSLSocket(dot_upstream.host, dot_upstream.port, cafile=tls_cert[0])
+
+        data = ssl_socket.connectsend("example.com")
+
+        response = dns.message.from_wire(data[2:])
+        assert response.answer[0][0].to_text().startswith("198.18.")
@@ -0,0 +1,189 @@
+"""Unit tests for the server-side TLS listener."""
+
+import socket
+import ssl
+import threading
+from unittest.mock import Mock, patch
+
+from dns_over_tls_server.server import DNSToTLSServer
+from dns_over_tls_server.tls import ServerTLSContext
+
+
+def _client_context(certfile):
+    context = ssl.create_default_context(cafile=certfile)
+    context.check_hostname = False
+    return context
+
+
+def _serve_once(server_tls, listener, results):
+    connection, _ = listener.accept()
+    try:
+        tls_connection = server_tls.wrap(connection)
+        results.append(tls_connection.session_reused)
+        tls_connection.sendall(tls_connection.recv(64))
+        tls_connection.close()
+    except (ssl.SSLError, OSError) as e:
+        results.append(e)
+        connection.close()
+
+
+def _handshake(server_tls, client_context, session=None):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    results = []
+    thread = threading.Thread(target=_serve_once, args=(server_tls, listener, results))
+    thread.start()
+    try:
+        client = client_context.wrap_socket(
+            socket.create_connection(listener.getsockname()),
+            server_hostname="localhost",
+            session=session,
+        )
+        client.sendall(b"ping")
+        assert client.recv(64) == b"ping"
+        session = client.session
+        client.close()
+    finally:
+        thread.join(timeout=5)
+        listener.close()
+    return results[0], session
+
+
+class TestServerTLSContext:
+    """Test cases for ServerTLSContext."""
+
+    def test_handshake(self, tls_cert):
+        """Test a client can complete a handshake against the context."""
+        server_tls = ServerTLSContext(*tls_cert)
+
+        reused, session = _handshake(server_tls, _client_context(tls_cert[0]))
+
+        assert reused is False
+        assert session is not None
+
+    def test_session_resumption(self, tls_cert):
+        """Test a returning client resumes with its session ticket."""
+        server_tls = ServerTLSContext(*tls_cert)
+        client_context = _client_context(tls_cert[0])
+        client_context.maximum_version = ssl.TLSVersion.TLSv1_2
+
+        _, session = _handshake(server_tls, client_context)
+        reused, _ = _handshake(server_tls, client_context, session=session)
+
+        assert reused is True
+
+    def test_ticket_rotation(self, tls_cert):
+        """Test the context is rebuilt once the rotation interval elapses."""
+        server_tls = ServerTLSContext(*tls_cert, ticket_rotation=60.0)
+        first = server_tls.current()
+
+        assert server_tls.current() is first
+
+        server_tls._rotated_at -= 61.0
+        assert server_tls.current() is not first
+
+    def test_failed_rotation_keeps_context(self, tls_cert):
+        """Test a context that cannot be rebuilt is kept until the next rotation."""
+        server_tls = ServerTLSContext(*tls_cert, ticket_rotation=60.0)
+        first = server_tls.current()
+        server_tls._rotated_at -= 61.0
+        server_tls.certfile = "/nonexistent/cert.pem"
+
+        with patch("dns_over_tls_server.tls.logging") as mock_logging:
+            assert server_tls.current() is first
+            assert server_tls.current() is first
+
+        mock_logging.error.assert_called_once()
+
+    def test_rotation_invalidates_old_tickets(self, tls_cert):
+        """Test tickets issued under rotated keys fall back to a full handshake."""
+        server_tls = ServerTLSContext(*tls_cert)
+        client_context = _client_context(tls_cert[0])
+        client_context.maximum_version = ssl.TLSVersion.TLSv1_2
+
+        _, session = _handshake(server_tls, client_context)
+        server_tls._rotated_at -= server_tls.ticket_rotation
+        reused, _ = _handshake(server_tls, client_context, session=session)
+
+        assert reused is False
+
+    def test_handshake_failure(self, tls_cert):
+        """Test a plaintext client fails the handshake instead of hanging."""
+        server_tls = ServerTLSContext(*tls_cert, handshake_timeout=1.0)
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        results = []
+        thread = threading.Thread(target=_serve_once, args=(server_tls, listener, results))
+        thread.start()
+
+        client = socket.create_connection(listener.getsockname())
+        client.sendall(b"example.com\n")
+        thread.join(timeout=5)
+        client.close()
+        listener.close()
+
+        assert isinstance(results[0], (ssl.SSLError, OSError))
+
+
+class TestTLSListener:
+    """Test cases for DNSToTLSServer with TLS enabled."""
+
+    def test_init_without_tls(self):
+        """Test TLS is disabled unless a certificate is configured."""
+        server = DNSToTLSServer()
+        assert server.tls is None
+
+    def test_init_with_tls(self, tls_cert):
+        """Test configuring a certificate enables the TLS listener."""
+        server = DNSToTLSServer(tls_certfile=tls_cert[0], tls_keyfile=tls_cert[1])
+        assert isinstance(server.tls, ServerTLSContext)
+
+    @patch("dns_over_tls_server.server.validators")
+    def test_handle_connection_over_tls(self, mock_validators, tls_cert):
+        """Test queries are served over a TLS client connection."""
+        mock_validators.domain.return_value = True
+        server = DNSToTLSServer(tls_certfile=tls_cert[0], tls_keyfile=tls_cert[1])
+        mock_resolver = Mock(return_value=b"resolved_result")
+        server._get_resolver = Mock(return_value=mock_resolver)
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+
+        def serve():
+            connection, client_address = listener.accept()
+            server._handle_connection(connection, client_address)
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        client = _client_context(tls_cert[0]).wrap_socket(
+            socket.create_connection(listener.getsockname()),
+            server_hostname="localhost",
+        )
+        client.sendall(b"example.com\n")
+        first = client.recv(64)
+        client.sendall(b"example.org\n")
+        second = client.recv(64)
+        client.close()
+        thread.join(timeout=5)
+        listener.close()
+
+        assert first == b"resolved_result"
+        assert second == b"resolved_result"
+        assert mock_resolver.call_count == 2
+
+    def test_handle_connection_handshake_failure(self, tls_cert):
+        """Test a failed handshake closes the connection without resolving."""
+        server = DNSToTLSServer(tls_certfile=tls_cert[0], tls_keyfile=tls_cert[1])
+        server.tls = Mock()
+        server.tls.wrap.side_effect = ssl.SSLError("handshake failed")
+        mock_resolver = Mock()
+        server._get_resolver = Mock(return_value=mock_resolver)
+        mock_connection = Mock()
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        mock_resolver.assert_not_called()
+        mock_connection.close.assert_called_once()
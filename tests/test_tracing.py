@@ -0,0 +1,227 @@
+"""Unit tests for per-query stage tracing."""
+
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from dns_over_tls_server import resolvers, tracing
+from dns_over_tls_server.cli import main
+from dns_over_tls_server.server import DNSToTLSServer
+from dns_over_tls_server.tracing import JSONLinesExporter, Trace, Tracer
+
+
+def _trace(*marks):
+    trace = Trace(query="example.com", client="127.0.0.1", started=marks[0][1])
+    trace.marks = list(marks)
+    return trace
+
+
+class TestTrace:
+    """Test cases for Trace."""
+
+    def test_stages(self):
+        """Test stage durations are measured from the previous boundary."""
+        trace = _trace(("start", 1.0), ("decode", 1.25), ("upstream", 3.0), ("send", 3.5))
+
+        assert trace.stages() == [("decode", 0.25), ("upstream", 1.75), ("send", 0.5)]
+        assert trace.total == 2.5
+        assert trace.breakdown() == "decode=250000us upstream=1750000us send=500000us"
+
+    def test_elapsed_excludes_client_wait(self):
+        """Test time spent waiting for the client is not counted."""
+        trace = _trace(("start", 1.0), ("queue", 1.5), ("recv", 11.5), ("send", 12.0))
+
+        assert trace.total == 11.0
+        assert trace.elapsed == 1.0
+
+    def test_as_dict_sums_repeated_stages(self):
+        """Test repeated stages, e.g. upstream retries, are summed."""
+        trace = _trace(("start", 1.0), ("upstream", 1.5), ("upstream", 2.5))
+
+        record = trace.as_dict()
+
+        assert record["query"] == "example.com"
+        assert record["stages_us"] == {"upstream": 1.5e6}
+        assert record["elapsed_us"] == 1.5e6
+        assert record["error"] is None
+
+
+class TestTracer:
+    """Test cases for Tracer."""
+
+    def test_mark_current_trace(self):
+        """Test mark() records into the trace current on this thread only."""
+        tracer = Tracer()
+        trace = tracer.start("127.0.0.1")
+        tracing.mark("upstream")
+        thread = threading.Thread(target=tracing.mark, args=("other",))
+        thread.start()
+        thread.join()
+        tracer.finish(trace)
+        tracing.mark("after")
+
+        assert [stage for stage, _ in trace.stages()] == ["upstream"]
+        assert tracing.current_trace() is None
+
+    def test_hooks_called(self):
+        """Test hooks receive finished traces and failing hooks are contained."""
+        tracer = Tracer()
+        hook = Mock()
+        tracer.add_hook(Mock(side_effect=RuntimeError("boom")))
+        tracer.add_hook(hook)
+
+        trace = tracer.start("127.0.0.1")
+        tracer.finish(trace)
+
+        hook.assert_called_once_with(trace)
+
+    @patch("dns_over_tls_server.tracing.logging")
+    def test_slow_queries_logged(self, mock_logging):
+        """Test only queries over the threshold are logged."""
+        tracer = Tracer(slow_threshold=1.0)
+
+        tracer.finish(_trace(("start", 1.0), ("upstream", 1.5)))
+        mock_logging.warning.assert_not_called()
+
+        tracer.finish(_trace(("start", 1.0), ("upstream", 3.0)))
+        mock_logging.warning.assert_called_once()
+        assert "upstream=2000000us" in mock_logging.warning.call_args.args
+
+    def test_json_lines_exporter(self, tmp_path):
+        """Test the exporter writes one JSON object per trace."""
+        path = tmp_path / "traces.jsonl"
+        exporter = JSONLinesExporter(str(path))
+
+        exporter(_trace(("start", 1.0), ("decode", 1.5)))
+        exporter(_trace(("start", 2.0), ("send", 2.25)))
+        exporter.close()
+
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [record["stages_us"] for record in records] == [{"decode": 5e5}, {"send": 2.5e5}]
+
+
+class TestServerTracing:
+    """Test tracing of queries served by the server."""
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_first_query_includes_connection_setup(self, mock_logging, mock_validators):
+        """Test the first query is traced from accept and later ones from receipt."""
+        tracer = Tracer()
+        traces = []
+        tracer.add_hook(traces.append)
+        server = DNSToTLSServer(tracer=tracer)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = [b"example.com\n", b"example.org\n", b""]
+        mock_validators.domain.return_value = True
+        server._get_resolver = Mock(return_value=Mock(return_value=b"resolved_result"))
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345), accepted_at=0.0)
+
+        assert [trace.query for trace in traces] == ["example.com", "example.org"]
+        assert [stage for stage, _ in traces[0].stages()] == [
+            "queue", "recv", "decode", "validate", "resolve", "send",
+        ]
+        assert [stage for stage, _ in traces[1].stages()] == [
+            "decode", "validate", "resolve", "send",
+        ]
+        assert tracing.current_trace() is None
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    def test_failed_query_reported(self, mock_logging, mock_validators):
+        """Test a query whose resolution fails is reported with its error."""
+        tracer = Tracer()
+        hook = Mock()
+        tracer.add_hook(hook)
+        server = DNSToTLSServer(tracer=tracer)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = [b"example.com\n", b""]
+        mock_validators.domain.return_value = True
+        server._get_resolver = Mock(return_value=Mock(side_effect=OSError("unreachable")))
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        (trace,) = hook.call_args.args
+        assert trace.error == "unreachable"
+        assert [stage for stage, _ in trace.stages()] == ["decode", "validate", "resolve"]
+        assert tracing.current_trace() is None
+
+    @patch("dns_over_tls_server.server.validators")
+    @patch("dns_over_tls_server.server.logging")
+    @patch("dns_over_tls_server.tracing.logging")
+    def test_slow_failure_logged(self, mock_tracing_logging, mock_logging, mock_validators):
+        """Test a query that times out after a while is logged as slow."""
+        tracer = Tracer(slow_threshold=0.01)
+        server = DNSToTLSServer(tracer=tracer)
+        mock_connection = Mock()
+        mock_connection.recv.side_effect = [b"example.com\n", b""]
+        mock_validators.domain.return_value = True
+
+        def resolver(query):
+            time.sleep(0.05)
+            raise TimeoutError("upstream timed out")
+
+        server._get_resolver = Mock(return_value=resolver)
+
+        server._handle_connection(mock_connection, ("127.0.0.1", 12345))
+
+        mock_tracing_logging.warning.assert_called_once()
+        assert " (failed: upstream timed out)" in mock_tracing_logging.warning.call_args.args
+
+    def test_pool_marks_upstream_stages(self, dot_upstream, use_upstream):
+        """Test the pool resolver attributes connect, handshake and round trip."""
+        use_upstream(dot_upstream)
+        tracer = Tracer()
+
+        first = tracer.start("127.0.0.1")
+        resolvers.resolve_with_pool("example.com")
+        tracer.finish(first)
+        second = tracer.start("127.0.0.1")
+        resolvers.resolve_with_pool("example.com")
+        tracer.finish(second)
+
+        assert [stage for stage, _ in first.stages()] == [
+            "upstream_connect", "upstream_handshake", "upstream",
+        ]
+        # The second query reuses the pooled connection
+        assert [stage for stage, _ in second.stages()] == ["upstream"]
+
+    def test_ssock_marks_upstream_stages(self, dot_upstream, use_upstream):
+        """Test the ssock resolver separates the TCP connect from the TLS handshake."""
+        use_upstream(dot_upstream)
+        tracer = Tracer()
+
+        trace = tracer.start("127.0.0.1")
+        resolvers.resolve_with_ssock("example.com")
+        tracer.finish(trace)
+
+        assert [stage for stage, _ in trace.stages()] == [
+            "upstream_connect", "upstream_handshake", "upstream",
+        ]
+
+
+class TestTraceArguments:
+    """Test the tracing command-line options."""
+
+    @patch("dns_over_tls_server.cli.signal")
+    @patch("dns_over_tls_server.server.DNSToTLSServer")
+    def test_trace_options(self, mock_server, mock_signal, tmp_path):
+        """Test --trace-slow-ms and --trace-file configure the tracer."""
+        path = tmp_path / "traces.jsonl"
+
+        main(["--trace-slow-ms", "50", "--trace-file", str(path)])
+
+        tracer = mock_server.call_args.kwargs["tracer"]
+        assert tracer.slow_threshold == 0.05
+        assert len(tracer.hooks) == 1
+        assert path.exists()
+
+    @patch("dns_over_tls_server.cli.signal")
+    @patch("dns_over_tls_server.server.DNSToTLSServer")
+    def test_tracing_off_by_default(self, mock_server, mock_signal):
+        """Test no tracer is created unless asked for."""
+        main([])
+
+        assert mock_server.call_args.kwargs["tracer"] is None